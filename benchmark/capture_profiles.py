@@ -0,0 +1,128 @@
+"""
+Compare capture profiles, Chromium flags and browser engines by measured capture time.
+
+Runs every variant against HA_URL (a real Home Assistant or a local stand-in)
+and prints one JSON document with the results, e.g.
+
+    python benchmark/capture_profiles.py --captures 10 > profiles.json
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import io
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+# The capture code lives in server/ and imports its siblings by name
+server_dir = str(Path(__file__).parent.parent / "server")
+if server_dir not in sys.path:
+    sys.path.insert(0, server_dir)
+
+from card_renderer import CARD_SIZE  # noqa: E402
+from home_assistant_card_capture import (  # noqa: E402
+    CAPTURE_PROFILES,
+    LEAN_CHROMIUM_ARGS,
+    CaptureProfile,
+    HomeAssistantCardCapture,
+)
+from PIL import Image  # noqa: E402
+
+
+def variants() -> Dict[str, CaptureProfile]:
+    """The stock profiles plus variations that change one thing at a time."""
+    native = CAPTURE_PROFILES["native"]
+    desktop = CAPTURE_PROFILES["desktop"]
+    return {
+        **CAPTURE_PROFILES,
+        "desktop-lean-args": dataclasses.replace(
+            desktop, name="desktop-lean-args", launch_args=LEAN_CHROMIUM_ARGS
+        ),
+        "native-unblocked": dataclasses.replace(
+            native, name="native-unblocked", blocked_resource_types=frozenset(), block_third_party=False
+        ),
+        "native-default-args": dataclasses.replace(native, name="native-default-args", launch_args=()),
+        "native-hidpi": dataclasses.replace(native, name="native-hidpi", device_scale_factor=2.0),
+        "native-firefox": dataclasses.replace(native, name="native-firefox", engine="firefox"),
+        "native-webkit": dataclasses.replace(native, name="native-webkit", engine="webkit"),
+    }
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    return {
+        "mean_ms": round(statistics.fmean(samples) * 1000, 1),
+        "p50_ms": round(statistics.median(samples) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1),
+    }
+
+
+async def run_variant(profile: CaptureProfile, captures: int, size) -> dict:
+    result = {"profile": profile.name, "engine": profile.engine}
+    capturer = HomeAssistantCardCapture(size=size, profile=profile)
+    requests = {"sent": 0, "failed": 0}
+    try:
+        started = time.perf_counter()
+        await capturer.start()
+        result["start_s"] = round(time.perf_counter() - started, 3)
+        capturer.context.on("request", lambda _: requests.__setitem__("sent", requests["sent"] + 1))
+        capturer.context.on(
+            "requestfailed", lambda _: requests.__setitem__("failed", requests["failed"] + 1)
+        )
+
+        cold, warm, data = [], [], None
+        for _ in range(captures):
+            # A cold capture loads the dashboard again, a warm one reuses the live page
+            for page in capturer.pages.values():
+                page.loaded = False
+            started = time.perf_counter()
+            data = await capturer.capture_weather_card()
+            cold.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            data = await capturer.capture_weather_card() or data
+            warm.append(time.perf_counter() - started)
+
+        if data is None:
+            result["error"] = "capture failed"
+            return result
+        with Image.open(io.BytesIO(data)) as image:
+            result["image_size"] = list(image.size)
+        result.update(
+            png_bytes=len(data),
+            cold=summarize(cold),
+            warm=summarize(warm),
+            requests_per_load=round(requests["sent"] / captures, 1),
+            blocked_per_load=round(requests["failed"] / captures, 1),
+        )
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        await capturer.close()
+    return result
+
+
+async def main() -> None:
+    available = variants()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", default=list(available), choices=list(available))
+    parser.add_argument("--captures", type=int, default=5, help="Cold and warm captures per profile")
+    parser.add_argument("--width", type=int, default=CARD_SIZE[0])
+    parser.add_argument("--height", type=int, default=CARD_SIZE[1])
+    args = parser.parse_args()
+
+    results = []
+    for name in args.profiles:
+        results.append(await run_variant(available[name], args.captures, (args.width, args.height)))
+        print(f"{name}: done", file=sys.stderr)
+    json.dump({"captures": args.captures, "results": results}, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,250 @@
+"""
+Measure the station's fetch, compose and display loop on an ordinary machine.
+
+Runs a stand-in Home Assistant (fake_home_assistant.py) and the card server
+with the Pillow renderer in their own processes, and the station's loop from
+client/main.py in this one, with the virtual panel instead of the Display HAT
+Mini. Reports the CPU time, wall time and allocations of every stage and the
+bytes sent to the panel per frame as one JSON document, e.g.
+
+    python benchmark/client_loop.py --cycles 20 > client.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Log to the console only, project modules read this when they are first imported
+os.environ["LOG_USE_FILE_HANDLER"] = "false"
+
+from fake_home_assistant import DEFAULT_TOKEN  # noqa: E402
+from server_load import (  # noqa: E402
+    API_KEY,
+    free_port,
+    git_revision,
+    start_server,
+    stop_process,
+    wait_for_card,
+)
+
+repo_root = Path(__file__).parent.parent
+client_dir = str(repo_root / "client")
+
+# SPI clock of the Display HAT Mini
+DEFAULT_SPI_HZ = 60_000_000
+
+
+class Stages:
+    def __init__(self, allocations: bool) -> None:
+        self.allocations = allocations
+        self.samples: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+
+    @contextmanager
+    def measure(self, stage: str):
+        """Record the CPU time of the whole process, the wall time and the peak allocation of the block."""
+        if self.allocations:
+            tracemalloc.reset_peak()
+            allocated = tracemalloc.get_traced_memory()[0]
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        yield
+        samples = self.samples[stage]
+        samples["cpu"].append(time.process_time() - cpu)
+        samples["wall"].append(time.perf_counter() - wall)
+        if self.allocations:
+            samples["alloc"].append(tracemalloc.get_traced_memory()[1] - allocated)
+
+    def summary(self) -> dict:
+        result = {}
+        for stage, samples in self.samples.items():
+            cpu, wall = samples["cpu"], samples["wall"]
+            result[stage] = {
+                "calls": len(cpu),
+                "cpu_ms_total": round(sum(cpu) * 1000, 2),
+                "cpu_ms_mean": round(statistics.fmean(cpu) * 1000, 3),
+                "cpu_ms_max": round(max(cpu) * 1000, 3),
+                "wall_ms_mean": round(statistics.fmean(wall) * 1000, 3),
+            }
+            if samples["alloc"]:
+                result[stage]["alloc_peak_kb_mean"] = round(statistics.fmean(samples["alloc"]) / 1024, 1)
+                result[stage]["alloc_peak_kb_max"] = round(max(samples["alloc"]) / 1024, 1)
+        return result
+
+
+async def start_fake_home_assistant(change_interval: float) -> Tuple[subprocess.Popen, str]:
+    """Run the stand-in in its own process, so its CPU time is not counted as the station's."""
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            str(Path(__file__).parent / "fake_home_assistant.py"),
+            "--port",
+            "0",
+            "--change-interval",
+            str(change_interval),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    # It prints its URL once it listens
+    line = await asyncio.to_thread(process.stdout.readline)
+    if not line:
+        raise RuntimeError("The fake Home Assistant did not start")
+    return process, json.loads(line)["ha_url"]
+
+
+async def run(args: argparse.Namespace) -> dict:
+    fake, ha_url = await start_fake_home_assistant(args.change_interval)
+    port = free_port()
+    server = start_server(
+        ha_url,
+        port,
+        token=DEFAULT_TOKEN,
+        RENDERER="pillow",
+        CAPTURE_INTERVAL=str(args.capture_interval),
+    )
+    try:
+        await wait_for_card(f"http://127.0.0.1:{port}", args.start_timeout)
+
+        # The station reads its settings when its modules are imported
+        os.environ.update(
+            DISPLAY_BACKEND="virtual",
+            HA_URL=ha_url,
+            HA_TOKEN=DEFAULT_TOKEN,
+            API_KEY=API_KEY,
+            WEATHER_CARD_SERVER_URLS=f"http://127.0.0.1:{port}",
+            WEATHER_CARD_FORMAT=args.format,
+            WEATHER_CARD_DELTAS="true" if args.deltas else "false",
+            WEATHER_CARD_MODE=args.card_mode,
+            NATIVE_CARD_INTERVAL="0",
+            HA_WEBSOCKET="true" if args.websocket else "false",
+            HISTORY_PATH="",
+            LOG_LEVEL="WARNING",
+        )
+        if client_dir not in sys.path:
+            sys.path.insert(0, client_dir)
+        import main as station
+        from http_session import close_session
+
+        stages = Stages(args.allocations)
+        if station.ha_websocket:
+            station.ha_websocket.start()
+            # Read the thermometer from pushed states, like the station once it is connected
+            deadline = time.monotonic() + args.start_timeout
+            while not station.ha_websocket.connected and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+        if args.allocations:
+            tracemalloc.start()
+        try:
+            with stages.measure("backfill"):
+                await station.backfill_history()
+
+            panel = station.display.panel
+            frame_bytes, frame_spi_bytes, frame_windows = [], [], []
+            clock = datetime.now()
+            for cycle in range(args.cycles):
+                with stages.measure("thermometer"):
+                    current_temp = await station.update_thermometer()
+                with stages.measure("card"):
+                    weather_card = await station.update_weather_card()
+                with stages.measure("compose"):
+                    background = station.compose_background(current_temp, weather_card)
+
+                for _ in range(args.ticks):
+                    # Every tick shows the next second, without waiting for it
+                    clock += timedelta(seconds=1)
+                    with stages.measure("clock"):
+                        station.draw_clock(background, clock.strftime("%Y-%m-%d %H:%M:%S"))
+                    with stages.measure("display"):
+                        station.display.display()
+                    writes = panel.take_writes()
+                    frame_bytes.append(sum(write.pixel_bytes for write in writes))
+                    frame_spi_bytes.append(sum(write.spi_bytes for write in writes))
+                    frame_windows.append(len(writes))
+
+                if args.save_frames:
+                    Path(args.save_frames).mkdir(parents=True, exist_ok=True)
+                    panel.frame().save(Path(args.save_frames) / f"cycle-{cycle:03}.png")
+                if args.cycle_delay:
+                    await asyncio.sleep(args.cycle_delay)
+        finally:
+            if args.allocations:
+                tracemalloc.stop()
+            if station.ha_websocket:
+                await station.ha_websocket.stop()
+            await close_session()
+    finally:
+        stop_process(server)
+        stop_process(fake)
+
+    full_frame = panel.width * panel.height * 2
+    return {
+        "revision": git_revision(),
+        "config": {
+            "cycles": args.cycles,
+            "ticks": args.ticks,
+            "format": args.format,
+            "deltas": args.deltas,
+            "card_mode": args.card_mode,
+            "websocket": args.websocket,
+            "capture_interval_s": args.capture_interval,
+            "change_interval_s": args.change_interval,
+            "cycle_delay_s": args.cycle_delay,
+            "allocations": args.allocations,
+        },
+        "stages": stages.summary(),
+        "frames": {
+            "count": len(frame_bytes),
+            "full_frame_bytes": full_frame,
+            "pixel_bytes_mean": round(statistics.fmean(frame_bytes)),
+            "pixel_bytes_max": max(frame_bytes),
+            "spi_bytes_total": sum(frame_spi_bytes),
+            "windows_mean": round(statistics.fmean(frame_windows), 2),
+            "spi_ms_mean": round(statistics.fmean(frame_spi_bytes) * 8 / args.spi_hz * 1000, 3),
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--cycles", type=int, default=20, help="Cycles of fetching and composing")
+    parser.add_argument("--ticks", type=int, default=15, help="Clock ticks per cycle, like the station")
+    parser.add_argument("--format", choices=["png", "webp", "rgb565"], default="png")
+    parser.add_argument("--no-deltas", dest="deltas", action="store_false", help="Always download full cards")
+    parser.add_argument("--card-mode", choices=["server", "native"], default="server")
+    parser.add_argument(
+        "--no-websocket", dest="websocket", action="store_false", help="Poll the thermometer over REST"
+    )
+    parser.add_argument("--capture-interval", type=float, default=1.0, help="CAPTURE_INTERVAL of the server")
+    parser.add_argument(
+        "--change-interval", type=float, default=2.0, help="Seconds between weather changes"
+    )
+    parser.add_argument(
+        "--cycle-delay", type=float, default=0.5, help="Seconds between cycles, so the card changes"
+    )
+    parser.add_argument(
+        "--no-allocations",
+        dest="allocations",
+        action="store_false",
+        help="Don't trace allocations, they slow every stage down",
+    )
+    parser.add_argument("--spi-hz", type=int, default=DEFAULT_SPI_HZ, help="SPI clock for the transfer time")
+    parser.add_argument("--save-frames", help="Directory to save the panel's frame of every cycle in")
+    parser.add_argument("--start-timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+"""
+A local stand-in for Home Assistant, for benchmarks that must not depend on a live instance.
+
+Serves what the server and the stations use:
+
+- every other path is a dashboard page with a <home-assistant> element, the
+  login form of the frontend and a hui-weather-forecast-card that shows the
+  weather entity
+- /auth/token logs the form in and returns tokens with a refresh token
+- /api/states/<entity_id> for the weather entity and sensor.*_temperature,
+  _humidity and _pressure sensors
+- /api/services/weather/get_forecasts and /api/history/period/<start>
+- /api/websocket with authentication and subscribe_entities, which pushes
+  the changes of the subscribed entities
+
+The weather changes every --change-interval seconds, deterministically, so two
+runs see the same sequence of cards. Run it on its own with
+
+    python benchmark/fake_home_assistant.py --port 8123
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+
+from aiohttp import WSMsgType, web
+
+DEFAULT_TOKEN = "benchmark-token"
+DEFAULT_USERNAME = "benchmark"
+DEFAULT_PASSWORD = "benchmark"
+WEATHER_ENTITY = "weather.smhi_home"
+CONDITIONS = ["sunny", "partlycloudy", "cloudy", "rainy", "pouring", "snowy", "fog", "clear-night"]
+SENSOR_UNITS = {"temperature": "°C", "humidity": "%", "pressure": "hPa"}
+
+DASHBOARD_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Home Assistant</title>
+<style>
+  body { margin: 0; background: #111; color: #e1e1e1; font-family: sans-serif; }
+  hui-weather-forecast-card { display: block; box-sizing: border-box; width: 100%; max-width: 500px;
+                              margin: 8px; padding: 16px; background: #1c1c1c; border-radius: 12px; }
+  .current { display: flex; align-items: center; justify-content: space-between; }
+  .temperature { font-size: 40px; }
+  .details { color: #9fa1a5; text-align: right; }
+  .forecast { display: flex; justify-content: space-between; margin-top: 16px; text-align: center; }
+  .forecast .day { color: #9fa1a5; }
+  form { display: flex; flex-direction: column; gap: 8px; max-width: 300px; margin: 64px auto; }
+</style>
+</head>
+<body>
+<home-assistant></home-assistant>
+<script>
+const ENTITY = "__ENTITY__";
+const REFRESH_MS = __REFRESH_MS__;
+customElements.define("home-assistant", class extends HTMLElement {});
+customElements.define("hui-weather-forecast-card", class extends HTMLElement {});
+const root = document.querySelector("home-assistant");
+
+function tokens() {
+  try { return JSON.parse(localStorage.getItem("hassTokens")); } catch (e) { return null; }
+}
+
+function showLogin() {
+  root.hass = null;
+  root.innerHTML = '<form><input name="username" autocomplete="username">' +
+    '<input name="password" type="password" autocomplete="current-password">' +
+    '<button type="submit">Log in</button></form>';
+  root.querySelector("form").addEventListener("submit", async (event) => {
+    event.preventDefault();
+    const resp = await fetch("/auth/token", {method: "POST", body: new FormData(event.target)});
+    if (resp.ok) {
+      localStorage.setItem("hassTokens", JSON.stringify(await resp.json()));
+      render();
+    }
+  });
+}
+
+async function render() {
+  const stored = tokens();
+  if (!stored || !stored.access_token) {
+    return showLogin();
+  }
+  const headers = {Authorization: "Bearer " + stored.access_token};
+  const [state, forecast] = await Promise.all([
+    fetch("/api/states/" + ENTITY, {headers}),
+    fetch("/api/services/weather/get_forecasts?return_response", {
+      method: "POST", headers, body: JSON.stringify({entity_id: ENTITY, type: "daily"}),
+    }),
+  ]);
+  if (state.status === 401) {
+    localStorage.removeItem("hassTokens");
+    return showLogin();
+  }
+  const weather = await state.json();
+  const days = (await forecast.json()).service_response[ENTITY].forecast;
+  const a = weather.attributes;
+  const html = '<hui-weather-forecast-card><div class="current">' +
+    '<div class="temperature">' + a.temperature + a.temperature_unit + '</div>' +
+    '<div class="details"><div>' + weather.state + '</div><div>' +
+    a.wind_speed + ' ' + a.wind_speed_unit + ', ' + a.humidity + ' %</div></div></div>' +
+    '<div class="forecast">' + days.map((day) =>
+      '<div><div class="day">' + new Date(day.datetime).toLocaleDateString("en", {weekday: "short"}) +
+      '</div><div>' + day.condition + '</div><div>' + day.temperature + '° ' + day.templow + '°</div></div>'
+    ).join("") + '</div></hui-weather-forecast-card>';
+  // Like the frontend, only touch the DOM when the state changed
+  if (root.innerHTML !== html) {
+    root.innerHTML = html;
+  }
+  root.hass = {connected: true};
+}
+
+render();
+setInterval(render, REFRESH_MS);
+</script>
+</body>
+</html>
+"""
+
+
+def compress_diff(previous: dict, current: dict) -> dict:
+    """The change between two compressed states, in the format of subscribe_entities."""
+    added = {key: current[key] for key in ("s", "lc") if previous[key] != current[key]}
+    attributes = {
+        name: value for name, value in current["a"].items() if previous["a"].get(name) != value
+    }
+    if attributes:
+        added["a"] = attributes
+    diff = {"+": added}
+    removed = [name for name in previous["a"] if name not in current["a"]]
+    if removed:
+        diff["-"] = {"a": removed}
+    return diff
+
+
+class FakeHomeAssistant:
+    def __init__(
+        self,
+        token: str = DEFAULT_TOKEN,
+        username: str = DEFAULT_USERNAME,
+        password: str = DEFAULT_PASSWORD,
+        change_interval: float = 60.0,
+        api_latency: float = 0.0,
+        push_interval: float = 1.0,
+    ) -> None:
+        """
+        A Home Assistant stand-in with a weather entity that changes over time.
+
+        Args:
+            token (str): The access token the API accepts
+            username (str): User name of the login form
+            password (str): Password of the login form
+            change_interval (float): Seconds between two changes of the weather
+            api_latency (float): Seconds every API response is delayed, to model a slow instance
+            push_interval (float): Seconds between two checks for state changes to push
+        """
+        self.token = token
+        self.username = username
+        self.password = password
+        self.change_interval = change_interval
+        self.api_latency = api_latency
+        self.push_interval = push_interval
+        self.requests = 0
+        # States set by a test or benchmark, they win over the generated ones
+        self.overrides: Dict[str, dict] = {}
+        self.websocket_connections = 0
+        self.websocket_auth_failures = 0
+        self._websockets: Set[web.WebSocketResponse] = set()
+        self._runner: Optional[web.AppRunner] = None
+
+    def _step(self, now: Optional[float] = None) -> int:
+        return int((now or time.time()) // self.change_interval)
+
+    def weather_state(self) -> dict:
+        step = self._step()
+        return {
+            "entity_id": WEATHER_ENTITY,
+            "state": CONDITIONS[step % len(CONDITIONS)],
+            "attributes": {
+                "temperature": round(8 + 6 * math.sin(step / 5), 1),
+                "temperature_unit": "°C",
+                "humidity": 60 + step % 30,
+                "cloud_coverage": step % 100,
+                "pressure": 1000 + step % 30,
+                "pressure_unit": "hPa",
+                "wind_bearing": (step * 37) % 360,
+                "wind_gust_speed": round(5 + 3 * math.cos(step / 3), 1),
+                "wind_speed": round(3 + 2 * math.cos(step / 3), 1),
+                "wind_speed_unit": "m/s",
+                "visibility": 50,
+                "visibility_unit": "km",
+                "precipitation_unit": "mm",
+                "thunder_probability": 0,
+                "attribution": "Benchmark",
+                "friendly_name": "Home",
+                "supported_features": 3,
+            },
+            "last_changed": datetime.fromtimestamp(
+                step * self.change_interval, timezone.utc
+            ).isoformat(),
+        }
+
+    def forecast(self, days: int = 5) -> list:
+        step = self._step()
+        today = datetime.now(timezone.utc).replace(hour=12, minute=0, second=0, microsecond=0)
+        return [
+            {
+                "datetime": (today + timedelta(days=day)).isoformat(),
+                "condition": CONDITIONS[(step + day) % len(CONDITIONS)],
+                "temperature": round(10 + 4 * math.sin((step + day) / 4), 1),
+                "templow": round(2 + 3 * math.sin((step + day) / 4), 1),
+                "precipitation": round(day * 0.4, 1),
+                "wind_speed": 4.0,
+            }
+            for day in range(days)
+        ]
+
+    def sensor_value(self, kind: str, at: Optional[float] = None) -> float:
+        phase = (at or time.time()) / 3600
+        if kind == "temperature":
+            return round(5 + 5 * math.sin(phase / 4), 1)
+        if kind == "humidity":
+            return round(70 + 20 * math.cos(phase / 6), 1)
+        return round(1013 + 8 * math.sin(phase / 12), 1)
+
+    def sensor_state(self, entity_id: str) -> Optional[dict]:
+        if entity_id in self.overrides:
+            return self.overrides[entity_id]
+        kind = entity_id.rsplit("_", 1)[-1]
+        if not entity_id.startswith("sensor.") or kind not in SENSOR_UNITS:
+            return None
+        return {
+            "entity_id": entity_id,
+            "state": str(self.sensor_value(kind)),
+            "attributes": {"unit_of_measurement": SENSOR_UNITS[kind]},
+            "last_changed": datetime.fromtimestamp(
+                time.time() // 3600 * 3600, timezone.utc
+            ).isoformat(),
+        }
+
+    def state(self, entity_id: str) -> Optional[dict]:
+        if entity_id == WEATHER_ENTITY and entity_id not in self.overrides:
+            return self.weather_state()
+        return self.sensor_state(entity_id)
+
+    def set_state(self, entity_id: str, state: str, attributes: Optional[dict] = None) -> None:
+        """Give an entity a fixed state, it is pushed to WebSocket subscribers."""
+        previous = self.state(entity_id) or {}
+        self.overrides[entity_id] = {
+            "entity_id": entity_id,
+            "state": state,
+            "attributes": previous.get("attributes", {}) if attributes is None else attributes,
+            "last_changed": datetime.now(timezone.utc).isoformat(),
+        }
+
+    async def disconnect_websockets(self) -> None:
+        """Drop every WebSocket connection, like a restart of Home Assistant."""
+        for ws in list(self._websockets):
+            await ws.close()
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        self.requests += 1
+        # The WebSocket API authenticates with its first message instead
+        if request.path.startswith("/api/") and request.path != "/api/websocket":
+            if self.api_latency:
+                await asyncio.sleep(self.api_latency)
+            if request.headers.get("Authorization") != f"Bearer {self.token}":
+                raise web.HTTPUnauthorized(text="401: Unauthorized")
+        return await handler(request)
+
+    async def dashboard(self, request: web.Request) -> web.Response:
+        refresh_ms = int(min(self.change_interval, 30) * 1000)
+        page = DASHBOARD_PAGE.replace("__ENTITY__", WEATHER_ENTITY).replace(
+            "__REFRESH_MS__", str(refresh_ms)
+        )
+        return web.Response(text=page, content_type="text/html")
+
+    async def login(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        if form.get("username") != self.username or form.get("password") != self.password:
+            raise web.HTTPBadRequest(text="Invalid username or password")
+        origin = f"{request.scheme}://{request.host}"
+        return web.json_response(
+            {
+                "hassUrl": origin,
+                "clientId": f"{origin}/",
+                "access_token": self.token,
+                "token_type": "Bearer",
+                "expires_in": 1800,
+                "expires": int(time.time() * 1000) + 1800 * 1000,
+                "refresh_token": "benchmark-refresh-token",
+            }
+        )
+
+    async def api_status(self, request: web.Request) -> web.Response:
+        return web.json_response({"message": "API running."})
+
+    async def get_state(self, request: web.Request) -> web.Response:
+        state = self.state(request.match_info["entity_id"])
+        if state is None:
+            raise web.HTTPNotFound(text="Entity not found.")
+        return web.json_response(state)
+
+    async def get_forecasts(self, request: web.Request) -> web.Response:
+        body = json.loads(await request.text() or "{}")
+        if body.get("entity_id") != WEATHER_ENTITY:
+            raise web.HTTPBadRequest(text="Unknown entity")
+        return web.json_response(
+            {"changed_states": [], "service_response": {WEATHER_ENTITY: {"forecast": self.forecast()}}}
+        )
+
+    async def get_history(self, request: web.Request) -> web.Response:
+        start = datetime.fromisoformat(request.match_info["start"]).timestamp()
+        end = time.time()
+        history = []
+        for entity_id in request.query.get("filter_entity_id", "").split(","):
+            kind = entity_id.rsplit("_", 1)[-1]
+            if not entity_id.startswith("sensor.") or kind not in SENSOR_UNITS:
+                continue
+            # One state every five minutes, only the first one carries the entity_id
+            states = [
+                {
+                    "state": str(self.sensor_value(kind, at)),
+                    "last_changed": datetime.fromtimestamp(at, timezone.utc).isoformat(),
+                }
+                for at in range(int(start), int(end), 300)
+            ]
+            if states:
+                states[0]["entity_id"] = entity_id
+                history.append(states)
+        return web.json_response(history)
+
+    async def websocket(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.websocket_connections += 1
+        await ws.send_json({"type": "auth_required", "ha_version": "2024.6.0"})
+        message = await ws.receive_json()
+        if message.get("type") != "auth" or message.get("access_token") != self.token:
+            self.websocket_auth_failures += 1
+            await ws.send_json({"type": "auth_invalid", "message": "Invalid access token or password"})
+            await ws.close()
+            return ws
+        await ws.send_json({"type": "auth_ok", "ha_version": "2024.6.0"})
+
+        self._websockets.add(ws)
+        pushers: List[asyncio.Task] = []
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    break
+                command = msg.json()
+                if command.get("type") == "subscribe_entities":
+                    await ws.send_json(
+                        {"id": command["id"], "type": "result", "success": True, "result": None}
+                    )
+                    pushers.append(
+                        asyncio.create_task(
+                            self._push_entities(ws, command["id"], command.get("entity_ids", []))
+                        )
+                    )
+                else:
+                    await ws.send_json(
+                        {
+                            "id": command.get("id"),
+                            "type": "result",
+                            "success": False,
+                            "error": {"code": "unknown_command", "message": "Unknown command."},
+                        }
+                    )
+        finally:
+            self._websockets.discard(ws)
+            for task in pushers:
+                task.cancel()
+        return ws
+
+    async def _push_entities(self, ws: web.WebSocketResponse, subscription_id: int, entity_ids: list) -> None:
+        """Send the states of the entities, then their changes as compressed diffs, like subscribe_entities."""
+        sent: Dict[str, dict] = {}
+        first = True
+        while not ws.closed:
+            added, changed = {}, {}
+            for entity_id in entity_ids:
+                state = self.state(entity_id)
+                if state is None:
+                    continue
+                compressed = {
+                    "s": state["state"],
+                    "a": state["attributes"],
+                    "lc": datetime.fromisoformat(state["last_changed"]).timestamp(),
+                }
+                previous = sent.get(entity_id)
+                if previous is None:
+                    added[entity_id] = compressed
+                elif previous != compressed:
+                    changed[entity_id] = compress_diff(previous, compressed)
+                sent[entity_id] = compressed
+            # The first event carries all states, even if there are none
+            if first or added or changed:
+                event = {"a": added} if first else {"a": added, "c": changed}
+                await ws.send_json({"id": subscription_id, "type": "event", "event": event})
+                first = False
+            await asyncio.sleep(self.push_interval)
+
+    def create_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_post("/auth/token", self.login)
+        app.router.add_get("/api/", self.api_status)
+        app.router.add_get("/api/states/{entity_id}", self.get_state)
+        app.router.add_post("/api/services/weather/get_forecasts", self.get_forecasts)
+        app.router.add_get("/api/history/period/{start}", self.get_history)
+        app.router.add_get("/api/websocket", self.websocket)
+        app.router.add_get("/{path:.*}", self.dashboard)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Serve the stand-in in the running event loop.
+
+        Args:
+            host (str): Address to listen on
+            port (int): Port to listen on, a free one if 0
+
+        Returns:
+            str: The URL to use as HA_URL
+        """
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8123)
+    parser.add_argument("--token", default=DEFAULT_TOKEN)
+    parser.add_argument("--change-interval", type=float, default=60.0)
+    parser.add_argument("--api-latency", type=float, default=0.0)
+    parser.add_argument("--push-interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    fake = FakeHomeAssistant(
+        token=args.token,
+        change_interval=args.change_interval,
+        api_latency=args.api_latency,
+        push_interval=args.push_interval,
+    )
+
+    async def serve() -> None:
+        url = await fake.start(args.host, args.port)
+        print(json.dumps({"ha_url": url, "token": fake.token, "username": fake.username}), flush=True)
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
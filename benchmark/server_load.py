@@ -0,0 +1,361 @@
+"""
+Measure server throughput, tail latency, captures and memory under concurrent load.
+
+Starts a local stand-in Home Assistant (fake_home_assistant.py), runs the
+server against it in its own process and drives it with concurrent clients
+that request the weather card like the stations do. Prints one JSON document,
+so the results of two commits can be compared, e.g.
+
+    python benchmark/server_load.py --clients 50 --duration 30 > load.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+# Log to the console only, project modules read this when they are first imported
+os.environ["LOG_USE_FILE_HANDLER"] = "false"
+
+from fake_home_assistant import DEFAULT_PASSWORD, DEFAULT_USERNAME, FakeHomeAssistant  # noqa: E402
+
+repo_root = Path(__file__).parent.parent
+server_dir = str(repo_root / "server")
+if server_dir not in sys.path:
+    sys.path.insert(0, server_dir)
+
+from renderer_supervisor import PAGE_SIZE, child_processes_rss  # noqa: E402
+
+API_KEY = "benchmark-key"
+# Accept header the stations send for each --format
+ACCEPT = {"png": "image/png", "webp": "image/webp, image/png;q=0.9", "rgb565": "application/x-rgb565"}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_rss(pid: int) -> Optional[int]:
+    """Resident memory of a single process in bytes, None where /proc is not available."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def parse_metrics(text: str) -> Dict[Tuple[str, str], float]:
+    """Read the samples of the Prometheus text format into {(name, labels): value}."""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        series, _, value = line.rpartition(" ")
+        name, _, labels = series.partition("{")
+        samples[(name, labels.rstrip("}"))] = float(value)
+    return samples
+
+
+def metric_delta(before: dict, after: dict, name: str) -> Dict[str, float]:
+    """Increase of every series of a metric between two scrapes, keyed by its labels."""
+    return {
+        labels: round(value - before.get((sample, labels), 0.0), 6)
+        for (sample, labels), value in after.items()
+        if sample == name
+    }
+
+
+def label_value(labels: str) -> str:
+    """The value of a single label, e.g. 'success' of result="success"."""
+    return labels.partition("=")[2].strip('"')
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if len(samples) < 2:
+        return {}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "mean_ms": round(statistics.fmean(samples) * 1000, 2),
+        "p50_ms": round(cuts[49] * 1000, 2),
+        "p95_ms": round(cuts[94] * 1000, 2),
+        "p99_ms": round(cuts[98] * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+    }
+
+
+class Load:
+    def __init__(self, url: str, args: argparse.Namespace) -> None:
+        self.url = url
+        self.args = args
+        self.latencies: List[float] = []
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.bytes_received = 0
+        self.measuring = False
+
+    async def client(self, deadline: float) -> None:
+        """One station: its own connection, requesting the card until the deadline."""
+        headers = {"X-API-Key": API_KEY}
+        if self.args.format:
+            headers["Accept"] = ACCEPT[self.args.format]
+        etag = None
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60)) as session:
+            while time.monotonic() < deadline:
+                request_headers = dict(headers)
+                if etag and self.args.conditional:
+                    request_headers["If-None-Match"] = etag
+                start = time.perf_counter()
+                try:
+                    async with session.get(f"{self.url}/weather-card", headers=request_headers) as resp:
+                        body = await resp.read()
+                        etag = resp.headers.get("ETag", etag)
+                        status = resp.status
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if self.measuring:
+                        self.errors[type(e).__name__] += 1
+                    await asyncio.sleep(0.1)
+                    continue
+                if self.measuring:
+                    self.latencies.append(time.perf_counter() - start)
+                    self.statuses[str(status)] += 1
+                    self.bytes_received += len(body)
+                if self.args.think_time:
+                    await asyncio.sleep(self.args.think_time)
+
+
+async def sample_memory(pid: int, peaks: Dict[str, int], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        server = process_rss(pid) or 0
+        browser = child_processes_rss(pid) or 0
+        peaks["server"] = max(peaks["server"], server)
+        peaks["browser"] = max(peaks["browser"], browser)
+        peaks["total"] = max(peaks["total"], server + browser)
+        try:
+            await asyncio.wait_for(stop.wait(), 0.2)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def wait_for_card(url: str, timeout: float) -> float:
+    """Wait until the server serves the first card, return how long that took since the start."""
+    start = time.monotonic()
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() - start < timeout:
+            try:
+                async with session.get(f"{url}/weather-card", headers={"X-API-Key": API_KEY}) as resp:
+                    if resp.status == 200:
+                        return time.monotonic() - start
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"The server did not serve a card within {timeout}s")
+
+
+async def scrape(url: str) -> dict:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{url}/metrics", headers={"X-API-Key": API_KEY}) as resp:
+            resp.raise_for_status()
+            return parse_metrics(await resp.text())
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=repo_root,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_server(ha_url: str, port: int, token: str, **settings: str) -> subprocess.Popen:
+    """
+    Run server/main.py against a stand-in Home Assistant in its own process.
+
+    Only the environment of the server process is set, a .env file can't
+    point it at a real Home Assistant, because set variables take precedence.
+
+    Args:
+        ha_url (str): URL of the stand-in
+        port (int): Port the server listens on
+        token (str): HA_TOKEN of the server, empty to log in with the form
+        settings (str): More environment variables, e.g. RENDERER="pillow"
+
+    Returns:
+        subprocess.Popen: The server process, it logs to stderr
+    """
+    workdir = tempfile.mkdtemp(prefix="weather-station-server-")
+    env = {
+        **os.environ,
+        "PORT": str(port),
+        "API_KEY": API_KEY,
+        "HA_URL": ha_url,
+        "HA_TOKEN": token,
+        "HA_USERNAME": DEFAULT_USERNAME,
+        "HA_PASSWORD": DEFAULT_PASSWORD,
+        "STORAGE_STATE_PATH": "",
+        "CARD_OUTPUT_PATH": "",
+        "LOG_DIR": workdir,
+        "LOG_USE_FILE_HANDLER": "false",
+        "LOG_LEVEL": "WARNING",
+        **settings,
+    }
+    # Keep stdout for the results
+    return subprocess.Popen(
+        [sys.executable, str(repo_root / "server" / "main.py")],
+        cwd=workdir,
+        env=env,
+        stdout=sys.stderr,
+    )
+
+
+def stop_process(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def run(args: argparse.Namespace) -> dict:
+    fake = FakeHomeAssistant(change_interval=args.change_interval, api_latency=args.api_latency)
+    ha_url = await fake.start()
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    server = start_server(
+        ha_url,
+        port,
+        # --login-form makes the browser log in with the form instead of the injected token
+        token="" if args.login_form and args.renderer == "browser" else fake.token,
+        RENDERER=args.renderer,
+        CAPTURE_PROFILE=args.profile,
+        CAPTURE_INTERVAL=str(args.capture_interval),
+        MAX_PAGES=str(args.max_pages),
+    )
+    peaks = {"server": 0, "browser": 0, "total": 0}
+    stop_sampling = asyncio.Event()
+    sampler = asyncio.create_task(sample_memory(server.pid, peaks, stop_sampling))
+    try:
+        first_card_s = await wait_for_card(url, args.start_timeout)
+        load = Load(url, args)
+
+        # Warm up connections and the cache before measuring
+        warmup_deadline = time.monotonic() + args.warmup
+        clients = [
+            asyncio.create_task(load.client(warmup_deadline + args.duration))
+            for _ in range(args.clients)
+        ]
+        await asyncio.sleep(args.warmup)
+        before = await scrape(url)
+        load.measuring = True
+        measure_start = time.monotonic()
+        await asyncio.gather(*clients)
+        elapsed = time.monotonic() - measure_start
+        load.measuring = False
+        after = await scrape(url)
+    finally:
+        stop_sampling.set()
+        await sampler
+        stop_process(server)
+        await fake.stop()
+
+    captures = metric_delta(before, after, "card_capture_seconds_count")
+    capture_sums = metric_delta(before, after, "card_capture_seconds_sum")
+    phase_counts = metric_delta(before, after, "card_capture_phase_seconds_count")
+    phase_sums = metric_delta(before, after, "card_capture_phase_seconds_sum")
+    requests = len(load.latencies)
+    return {
+        "revision": git_revision(),
+        "config": {
+            "clients": args.clients,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "think_time_s": args.think_time,
+            "conditional": args.conditional,
+            "format": args.format or "png",
+            "renderer": args.renderer,
+            "profile": args.profile,
+            "login_form": args.login_form,
+            "capture_interval_s": args.capture_interval,
+            "change_interval_s": args.change_interval,
+            "api_latency_s": args.api_latency,
+            "max_pages": args.max_pages,
+        },
+        "first_card_s": round(first_card_s, 3),
+        "requests": requests,
+        "errors": dict(load.errors),
+        "statuses": dict(load.statuses),
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else 0.0,
+        "bytes_per_request": round(load.bytes_received / requests) if requests else 0,
+        "latency": percentiles(load.latencies),
+        "captures": {label_value(labels): int(count) for labels, count in captures.items()},
+        "capture_mean_ms": {
+            label_value(labels): round(capture_sums[labels] / count * 1000, 1)
+            for labels, count in captures.items()
+            if count
+        },
+        "capture_phase_mean_ms": {
+            label_value(labels): round(phase_sums[labels] / count * 1000, 1)
+            for labels, count in phase_counts.items()
+            if count
+        },
+        "cache": {
+            label_value(labels): int(count)
+            for labels, count in metric_delta(before, after, "card_cache_requests_total").items()
+        },
+        "ha_requests": fake.requests,
+        "peak_rss_mb": {name: round(value / 1024 / 1024, 1) for name, value in peaks.items()},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--clients", type=int, default=20, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to measure")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Seconds of load before measuring")
+    parser.add_argument(
+        "--think-time", type=float, default=0.0, help="Seconds a client waits between requests"
+    )
+    parser.add_argument(
+        "--conditional",
+        action="store_true",
+        help="Send If-None-Match with the last ETag, like the stations",
+    )
+    parser.add_argument("--format", choices=list(ACCEPT), help="Card format to request")
+    parser.add_argument("--renderer", choices=["browser", "pillow"], default="browser")
+    parser.add_argument("--profile", default="native", help="CAPTURE_PROFILE of the browser renderer")
+    parser.add_argument(
+        "--login-form", action="store_true", help="Log the browser in with the form, not a token"
+    )
+    parser.add_argument("--capture-interval", type=float, default=5.0)
+    parser.add_argument(
+        "--change-interval", type=float, default=10.0, help="Seconds between weather changes"
+    )
+    parser.add_argument(
+        "--api-latency", type=float, default=0.0, help="Delay of every Home Assistant API response"
+    )
+    parser.add_argument("--max-pages", type=int, default=4)
+    parser.add_argument("--start-timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,78 @@
+import sys
 import time
-from displayhatmini import DisplayHATMini
-from grapics import Graphics
+from pathlib import Path
+from typing import Optional
+
+from grapics import Box, Graphics
+from panel import Panel, create_panel
+from PIL import Image, ImageChops
+
+# Add project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+from common import rgb565
 
 
 class Display:
-    def __init__(self):
-        self.width = DisplayHATMini.WIDTH
-        self.height = DisplayHATMini.HEIGHT
+    def __init__(self, panel: Optional[Panel] = None):
+        """
+        Draw with Graphics and send the changes to a panel.
+
+        Args:
+            panel (Panel, optional): Where frames are sent, the DISPLAY_BACKEND panel if None
+        """
+        self.panel = panel or create_panel()
+        self.width = self.panel.width
+        self.height = self.panel.height
         self.graphics = Graphics(self.width, self.height)
-        self.displayhatmini = DisplayHATMini(
-            self.graphics.get_image(), backlight_pwm=True
-        )
+        # What the panel currently shows, None until the first full update
+        self.front: Optional[Image.Image] = None
 
     def set_led(self, r: float, g: float, b: float):
-        self.displayhatmini.set_led(r, g, b)
+        self.panel.set_led(r, g, b)
 
     def set_backlight(self, brightness: float):
         if brightness >= 0.0 and brightness <= 1.0:
-            self.displayhatmini.set_backlight(brightness)
+            self.panel.set_backlight(brightness)
 
     def display(self):
-        self.displayhatmini.display()
+        """
+        Send the changes since the last call to the panel.
+
+        Only the areas Graphics marked as dirty are compared with what the
+        panel shows, and only the pixels that really changed are written,
+        using the controller's address window.
+        """
+        image = self.graphics.get_image()
+        dirty_rects = self.graphics.take_dirty_rects()
+        if self.front is None:
+            self.panel.show(image)
+            self.front = image.copy()
+            return
+
+        for box in dirty_rects:
+            changed = ImageChops.difference(image.crop(box), self.front.crop(box)).getbbox()
+            if not changed:
+                continue
+            window = (
+                box[0] + changed[0],
+                box[1] + changed[1],
+                box[0] + changed[2],
+                box[1] + changed[3],
+            )
+            region = image.crop(window)
+            self._write_window(window, region)
+            self.front.paste(region, window[:2])
+
+    def _write_window(self, box: Box, region: Image.Image) -> None:
+        """Write an area of the frame to the panel, which is mounted upside down."""
+        left, top, right, bottom = box
+        region = region.transpose(Image.Transpose.ROTATE_180)
+        self.panel.write_window(
+            (self.width - right, self.height - bottom, self.width - left - 1, self.height - top - 1),
+            rgb565.pack(region),
+        )
 
     def clear(self):
         self.graphics.clear_screen()
@@ -0,0 +1,28 @@
+from displayhatmini import DisplayHATMini
+from panel import Panel, Window
+from PIL import Image
+
+
+class DisplayHATMiniPanel(Panel):
+    def __init__(self):
+        """The Pimoroni Display HAT Mini, a 320x240 ST7789 panel on SPI."""
+        self.width = DisplayHATMini.WIDTH
+        self.height = DisplayHATMini.HEIGHT
+        self.displayhatmini = DisplayHATMini(
+            Image.new("RGB", (self.width, self.height)), backlight_pwm=True
+        )
+
+    def set_led(self, r: float, g: float, b: float) -> None:
+        self.displayhatmini.set_led(r, g, b)
+
+    def set_backlight(self, brightness: float) -> None:
+        self.displayhatmini.set_backlight(brightness)
+
+    def show(self, image: Image.Image) -> None:
+        # The driver rotates and converts full frames itself
+        self.displayhatmini.st7789.display(image)
+
+    def write_window(self, window: Window, data: bytes) -> None:
+        st7789 = self.displayhatmini.st7789
+        st7789.set_window(*window)
+        st7789.data(list(data))
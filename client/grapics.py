@@ -2,8 +2,11 @@ import os
 from pathlib import Path
 import platform
 import sys
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 from datetime import datetime
+from functools import lru_cache
+from typing import List, Tuple, Union
 
 # Add project root to Python path
 project_root = str(Path(__file__).parent.parent)
@@ -13,6 +16,18 @@ from common.logging_config import logger
 
 logger = logger.getChild(__name__)
 
+# (left, top, right, bottom), right and bottom are exclusive
+Box = Tuple[int, int, int, int]
+
+FONT_CACHE_SIZE = 16
+LAYOUT_CACHE_SIZE = 128
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def load_font(font_path: str, size: int) -> ImageFont.FreeTypeFont:
+    """Load a TrueType font, parsing each font file and size only once."""
+    return ImageFont.truetype(font_path, size)
+
 
 class Graphics:
     def __init__(self, width: int = 320, height: int = 240):
@@ -22,6 +37,12 @@ class Graphics:
         self.height = height
         self.font_path = self._find_font_path()  # Store only the path
         self.font = self._create_font(20)  # Default size
+        # Areas drawn to since the last call to take_dirty_rects
+        self.dirty_rects: List[Box] = [(0, 0, width, height)]
+        # Text measurements only depend on their arguments, the clock and
+        # temperature repeat them every second
+        self._text_bbox = lru_cache(maxsize=LAYOUT_CACHE_SIZE)(self._measure_text)
+        self._fit_text = lru_cache(maxsize=LAYOUT_CACHE_SIZE)(self._layout_fitted_text)
 
     def _find_font_path(self):
         # Try to find fonts with emoji support based on the operating system
@@ -57,12 +78,12 @@ class Graphics:
     def _create_font(self, size):
         if self.font_path:
             try:
-                return ImageFont.truetype(self.font_path, size)
+                return load_font(self.font_path, size)
             except Exception as e:
                 logger.warning(f"Failed to create font with size {size}: {str(e)}")
                 # Try with a fallback size if the requested size fails
                 try:
-                    return ImageFont.truetype(self.font_path, 16)
+                    return load_font(self.font_path, 16)
                 except Exception as e:
                     logger.warning(f"Failed to create fallback font: {str(e)}")
 
@@ -75,12 +96,20 @@ class Graphics:
     def draw_text(self, text, x=10, y=10, size=20):
         if size is not None:
             self.font = self._create_font(size)
-        self.draw.text((x, y), text, fill="white", font=self.font)
+        self._draw_text((x, y), text, self.font)
 
-    def draw_text_centerted(self, text, ratio=0.8) -> None:
-        # Create a temporary font to measure text
-        temp_font = self._create_font(100)  # Use a reference size of 100
-        text_bbox = temp_font.getbbox(text)
+    def _measure_text(self, text: str, font) -> Box:
+        return font.getbbox(text)
+
+    def _layout_fitted_text(self, text: str, ratio: float) -> Tuple[object, int, int]:
+        """
+        Find the largest font that fits the text into the screen scaled by ratio.
+
+        Returns:
+            Tuple[object, int, int]: The font, and the width and height of the text
+        """
+        # Measure the text with a reference size of 100
+        text_bbox = self._text_bbox(text, self._create_font(100))
         ref_width = text_bbox[2] - text_bbox[0]
         ref_height = text_bbox[3] - text_bbox[1]
 
@@ -95,45 +124,28 @@ class Graphics:
         font = self._create_font(font_size)
 
         # Get final text dimensions
-        text_bbox = font.getbbox(text)
-        text_width = text_bbox[2] - text_bbox[0]
-        text_height = text_bbox[3] - text_bbox[1]
+        text_bbox = self._text_bbox(text, font)
+        return font, text_bbox[2] - text_bbox[0], text_bbox[3] - text_bbox[1]
+
+    def draw_text_centerted(self, text, ratio=0.8) -> None:
+        font, text_width, text_height = self._fit_text(text, ratio)
 
         # Calculate position to center the text
         x = (self.width - text_width) // 2
         y = (self.height - text_height) // 2
 
         # Draw the text
-        self.draw.text((x, y), text, fill="white", font=font)
+        self._draw_text((x, y), text, font)
 
     def draw_text_bottom(self, text, ratio=0.8, padding=20) -> None:
-        # Create a temporary font to measure text
-        temp_font = self._create_font(100)  # Use a reference size of 100
-        text_bbox = temp_font.getbbox(text)
-        ref_width = text_bbox[2] - text_bbox[0]
-        ref_height = text_bbox[3] - text_bbox[1]
-
-        # Calculate scale factors based on screen dimensions and ratio
-        width_scale = (self.width * ratio) / ref_width
-        height_scale = (self.height * ratio) / ref_height
-
-        # Use the smaller scale to ensure text fits both dimensions
-        font_size = int(min(width_scale, height_scale) * 100)
-
-        # Create the final font with calculated size
-        font = self._create_font(font_size)
-
-        # Get final text dimensions
-        text_bbox = font.getbbox(text)
-        text_width = text_bbox[2] - text_bbox[0]
-        text_height = text_bbox[3] - text_bbox[1]
+        font, text_width, text_height = self._fit_text(text, ratio)
 
         # Calculate position to center horizontally and place at bottom
         x = (self.width - text_width) // 2
         y = self.height - text_height - padding
 
         # Draw the text
-        self.draw.text((x, y), text, fill="white", font=font)
+        self._draw_text((x, y), text, font)
 
     def draw_text_centered_horizontal(self, text: str, y: int, size: int = 20) -> None:
         """
@@ -148,39 +160,81 @@ class Graphics:
         font = self._create_font(size)
 
         # Get text dimensions
-        text_bbox = font.getbbox(text)
+        text_bbox = self._text_bbox(text, font)
         text_width = text_bbox[2] - text_bbox[0]
 
         # Calculate x position to center horizontally
         x = (self.width - text_width) // 2
 
         # Draw the text
-        self.draw.text((x, y), text, fill="white", font=font)
+        self._draw_text((x, y), text, font)
+
+    def _draw_text(self, xy: Tuple[int, int], text: str, font) -> None:
+        self.draw.text(xy, text, fill="white", font=font)
+        left, top, right, bottom = self._text_bbox(text, font)
+        self.mark_dirty((xy[0] + left, xy[1] + top, xy[0] + right, xy[1] + bottom))
 
     def clear_screen(self, color: tuple = (34, 34, 34)):
         self.draw.rectangle((0, 0, self.width, self.height), fill=color)
+        self.mark_dirty((0, 0, self.width, self.height))
+
+    def mark_dirty(self, box: Box) -> None:
+        """Record that an area of the image changed and has to be sent to the display."""
+        left, top, right, bottom = (int(v) for v in box)
+        left, top = max(0, left), max(0, top)
+        right, bottom = min(self.width, right), min(self.height, bottom)
+        if left < right and top < bottom:
+            self.dirty_rects.append((left, top, right, bottom))
+
+    def take_dirty_rects(self) -> List[Box]:
+        """
+        Return the areas drawn to since the last call and start tracking anew.
+
+        Overlapping and touching areas are merged, so every pixel is covered once.
+
+        Returns:
+            List[Box]: The dirty areas
+        """
+        rects = merge_rects(self.dirty_rects)
+        self.dirty_rects = []
+        return rects
 
     def get_image(self):
         return self.image
 
+    def snapshot(self) -> Image.Image:
+        """Copy the current frame, e.g. to keep the parts that rarely change as a layer."""
+        return self.image.copy()
+
+    def restore(self, layer: Image.Image, box: Box) -> None:
+        """
+        Copy an area of a layer taken with snapshot back into the frame.
+
+        Args:
+            layer (Image.Image): The layer to copy from
+            box (Box): The area to restore
+        """
+        self.image.paste(layer.crop(box), box[:2])
+        self.mark_dirty(box)
+
     def show(self):
         self.image.show()
 
     def draw_image(
-        self, image_path: str, x: int = 0, y: int = 0, scale: float = 1.0
+        self, image: Union[str, Image.Image], x: int = 0, y: int = 0, scale: float = 1.0
     ) -> None:
         """
-        Load and draw a PNG image at specified coordinates with optional scaling.
+        Draw a PNG image at specified coordinates with optional scaling.
 
         Args:
-            image_path (str): Path to the PNG image file
+            image (Union[str, Image.Image]): Path to the PNG image file or an already loaded image
             x (int): X coordinate to draw the image (default: 0)
             y (int): Y coordinate to draw the image (default: 0)
             scale (float): Scale factor for the image (default: 1.0)
         """
         try:
             # Load the image
-            img = Image.open(image_path)
+            img = Image.open(image) if isinstance(image, str) else image
 
             # Apply scaling if needed
             if scale != 1.0:
@@ -188,28 +242,79 @@ class Graphics:
                 new_height = int(img.height * scale)
                 img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
 
-            # Convert to RGBA if the image has transparency
             if img.mode == "RGBA":
-                # Create a new image with the same size as the main image
-                overlay = Image.new("RGBA", self.image.size, (0, 0, 0, 0))
-                # Paste the image onto the overlay
-                overlay.paste(img, (x, y), img)
-                # Convert the main image to RGBA if it isn't already
-                if self.image.mode != "RGBA":
-                    self.image = self.image.convert("RGBA")
-                # Composite the overlay onto the main image
-                self.image = Image.alpha_composite(self.image, overlay)
-                # Convert back to RGB
-                self.image = self.image.convert("RGB")
+                # Using the alpha channel as paste mask blends the image onto
+                # the opaque frame, only touching the pixels it covers
+                self.image.paste(img, (x, y), img)
             else:
                 # For non-transparent images, just paste directly
                 self.image.paste(img, (x, y))
-
-            # Update the draw object
-            self.draw = ImageDraw.Draw(self.image)
+            self.mark_dirty((x, y, x + img.width, y + img.height))
 
         except Exception as e:
-            logger.error(f"Failed to draw image {image_path}: {str(e)}")
+            logger.error(f"Failed to draw image {image}: {str(e)}")
+
+    def draw_sparkline(
+        self, lows: np.ndarray, highs: np.ndarray, box: Box, color: tuple = (120, 180, 255)
+    ) -> None:
+        """
+        Draw a sparkline from the lowest and highest value of every pixel column.
+
+        The whole line is rasterized at once as a mask, so drawing it costs the
+        same for an hour and for a week of readings.
+
+        Args:
+            lows (np.ndarray): Lowest value per column, NaN where there is no data
+            highs (np.ndarray): Highest value per column, same length as lows
+            box (Box): The area to draw in, one column per value
+            color (tuple): Color of the line
+        """
+        left, top, right, bottom = box
+        height = bottom - top
+        if np.all(np.isnan(lows)):
+            return
+        minimum, maximum = np.nanmin(lows), np.nanmax(highs)
+        scale = (height - 1) / (maximum - minimum) if maximum > minimum else 0.0
+        # Screen rows grow downwards, the highest value gets the smallest row
+        upper = (height - 1) - (highs - minimum) * scale
+        lower = (height - 1) - (lows - minimum) * scale
+        # Stretch every column to meet its left neighbour, so steps stay connected
+        previous_upper, previous_lower = upper[:-1].copy(), lower[:-1].copy()
+        upper[1:] = np.fmin(upper[1:], previous_lower)
+        lower[1:] = np.fmax(lower[1:], previous_upper)
+
+        rows = np.arange(height)[:, None]
+        mask = (rows >= np.round(upper)) & (rows <= np.round(lower))
+        mask_image = Image.fromarray((mask * 255).astype(np.uint8))
+        self.image.paste(color, (left, top, left + len(lows), bottom), mask_image)
+        self.mark_dirty(box)
+
+
+def merge_rects(rects: List[Box]) -> List[Box]:
+    """Merge overlapping or touching rectangles into their bounding boxes."""
+    merged: List[Box] = []
+    for rect in rects:
+        # Keep absorbing rectangles until the current one touches none of the rest
+        while True:
+            for other in merged:
+                if (
+                    rect[0] <= other[2]
+                    and other[0] <= rect[2]
+                    and rect[1] <= other[3]
+                    and other[1] <= rect[3]
+                ):
+                    merged.remove(other)
+                    rect = (
+                        min(rect[0], other[0]),
+                        min(rect[1], other[1]),
+                        max(rect[2], other[2]),
+                        max(rect[3], other[3]),
+                    )
+                    break
+            else:
+                break
+        merged.append(rect)
+    return merged
 
 
 def get_datetime():
@@ -3,15 +3,19 @@ import asyncio
 import os
 import sys
 
+from datetime import datetime, timezone
 from dotenv import load_dotenv
+from http_session import close_session, get_session
 from pathlib import Path
-from weather_data import WeatherData
+from typing import Dict, Iterable, List
+from urllib.parse import quote
 
 project_root = str(Path(__file__).parent.parent)
 if project_root not in sys.path:
     sys.path.append(project_root)
 
 from common.logging_config import logger
+from common.weather_data import Forecast, WeatherData
 
 logger = logger.getChild(__name__)
 # Load environment variables from .env file
@@ -20,6 +24,8 @@ load_dotenv()
 # Read from environment (make sure you've done `source .env`)
 HA_URL = os.getenv("HA_URL")
 HA_TOKEN = os.getenv("HA_TOKEN")
+WEATHER_ENTITY = os.getenv("WEATHER_ENTITY", "weather.smhi_home")
+FORECAST_TYPE = os.getenv("FORECAST_TYPE", "daily")
 
 if not HA_URL or not HA_TOKEN:
     raise RuntimeError("HA_URL and HA_TOKEN must be set in the environment")
@@ -41,48 +47,129 @@ async def get_entity_state(session: aiohttp.ClientSession, entity_id: str) -> di
                 return None
             resp.raise_for_status()
             return await resp.json()
-    except aiohttp.ClientError as e:
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         print(f"Error fetching {entity_id}: {str(e)}")
         return None
 
 
-async def get_thermometer_data(device_base: str) -> dict:
-    to_fetch = {
+def get_thermometer_entities(device_base: str) -> dict:
+    return {
         "temperature": f"{device_base}_temperature",
         "humidity": f"{device_base}_humidity",
         "pressure": f"{device_base}_pressure",
     }
 
-    async with aiohttp.ClientSession() as session:
-        # Gather all states concurrently
-        tasks = {
-            name: asyncio.create_task(get_entity_state(session, eid))
-            for name, eid in to_fetch.items()
-        }
-        results = {name: await task for name, task in tasks.items()}
-        return results
+
+async def get_thermometer_data(device_base: str) -> dict:
+    to_fetch = get_thermometer_entities(device_base)
+
+    session = await get_session()
+    # Gather all states concurrently
+    tasks = {
+        name: asyncio.create_task(get_entity_state(session, eid))
+        for name, eid in to_fetch.items()
+    }
+    results = {name: await task for name, task in tasks.items()}
+    return results
 
 
 async def get_weather_data() -> WeatherData:
     """
     Fetch weather data from SMHI integration in Home Assistant.
-    Returns a WeatherData instance, or None if not found.
+    Returns a WeatherData instance, or None if not found or not available,
+    e.g. while Home Assistant restarts and the entity is "unavailable".
     """
-    weather_entity = "weather.smhi_home"
-
-    async with aiohttp.ClientSession() as session:
-        weather_data = await get_entity_state(session, weather_entity)
-        if weather_data:
+    session = await get_session()
+    weather_data = await get_entity_state(session, WEATHER_ENTITY)
+    if weather_data:
+        try:
             return WeatherData.from_dict(
                 weather_data["attributes"], weather_data["state"]
             )
-        return None
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(
+                f"{WEATHER_ENTITY} has no usable weather data "
+                f"(state {weather_data.get('state')!r}): {e!r}"
+            )
+    return None
+
+
+async def get_forecast() -> List[Forecast]:
+    """
+    Fetch the forecast of the weather entity with the weather.get_forecasts service.
+
+    Home Assistant versions before 2024.3 have no such service and keep the
+    forecast in the entity's attributes instead, which is used as fallback.
+
+    Returns:
+        List[Forecast]: The forecast, empty if it is not available
+    """
+    url = f"{HA_URL}/api/services/weather/get_forecasts?return_response"
+    headers = {
+        "Authorization": f"Bearer {HA_TOKEN}",
+        "Content-Type": "application/json",
+    }
+    body = {"entity_id": WEATHER_ENTITY, "type": FORECAST_TYPE}
+    session = await get_session()
+    try:
+        async with session.post(url, json=body, headers=headers) as resp:
+            if resp.status == 200:
+                response = (await resp.json()).get("service_response", {})
+                return Forecast.from_list(response.get(WEATHER_ENTITY, {}).get("forecast", []))
+            logger.debug(f"weather.get_forecasts returned status {resp.status}")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error(f"Error fetching forecast: {str(e)}")
+        return []
+
+    state = await get_entity_state(session, WEATHER_ENTITY)
+    if state:
+        return Forecast.from_list(state["attributes"].get("forecast", []))
+    return []
+
+
+async def get_history(entity_ids: Iterable[str], start: datetime) -> Dict[str, List[dict]]:
+    """
+    Fetch the state changes of entities since `start` from the history API.
+
+    Args:
+        entity_ids (Iterable[str]): The entities to fetch
+        start (datetime): Beginning of the period, timezone aware
+
+    Returns:
+        Dict[str, List[dict]]: The states of every entity, oldest first. Only the first
+                               state carries the entity_id, the rest only state and
+                               last_changed. Empty if the request failed.
+    """
+    url = f"{HA_URL}/api/history/period/{quote(start.isoformat())}"
+    params = {
+        "filter_entity_id": ",".join(entity_ids),
+        "end_time": datetime.now(timezone.utc).isoformat(),
+        "minimal_response": "",
+        "no_attributes": "",
+    }
+    headers = {"Authorization": f"Bearer {HA_TOKEN}"}
+    session = await get_session()
+    try:
+        async with session.get(url, params=params, headers=headers) as resp:
+            resp.raise_for_status()
+            history = await resp.json()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error(f"Error fetching history: {str(e)}")
+        return {}
+    return {states[0]["entity_id"]: states for states in history if states}
+
+
+async def fetch_all(device_base: str):
+    try:
+        return await get_thermometer_data(device_base), await get_weather_data()
+    finally:
+        await close_session()
 
 
 def main():
     device_base = "sensor.temp_carport"
 
-    results = asyncio.run(get_thermometer_data(device_base))
+    results, weather_data = asyncio.run(fetch_all(device_base))
     for name, data in results.items():
         if data is None:
             print(f"{name.capitalize()}:: Not available")
@@ -93,7 +180,6 @@ def main():
 
     print("--------------------------------")
 
-    weather_data = asyncio.run(get_weather_data())
     if weather_data:
         print(f"Condition: {weather_data.state}")
         print(
@@ -0,0 +1,194 @@
+import asyncio
+import os
+import random
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import aiohttp
+from dotenv import load_dotenv
+from http_session import get_session
+
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from common.logging_config import logger
+
+logger = logger.getChild(__name__)
+load_dotenv()
+
+HA_URL = os.getenv("HA_URL")
+HA_TOKEN = os.getenv("HA_TOKEN")
+RECONNECT_MIN_DELAY = float(os.getenv("HA_WEBSOCKET_RECONNECT_MIN", 1))
+RECONNECT_MAX_DELAY = float(os.getenv("HA_WEBSOCKET_RECONNECT_MAX", 60))
+
+
+class HomeAssistantWebSocket:
+    def __init__(self, entity_ids: Iterable[str], url: Optional[str] = None) -> None:
+        """
+        Keep the state of a few Home Assistant entities up to date over the WebSocket API.
+
+        After authenticating with HA_TOKEN, the entities are subscribed with
+        subscribe_entities. Home Assistant answers with their current states
+        and then pushes only the changes of those entities, as compressed diffs.
+        Neither a reconnect nor a change transfers the states of the rest of
+        the instance.
+
+        Args:
+            entity_ids (Iterable[str]): The entities to follow
+            url (str, optional): WebSocket URL, derived from HA_URL by default
+        """
+        self.entity_ids = list(entity_ids)
+        self.url = url or f"{HA_URL.replace('http', 'ws', 1)}/api/websocket"
+        self.states: Dict[str, dict] = {}
+        self.connected = False
+        self._changed = asyncio.Event()
+        self._message_id = 0
+        # Seconds to wait before the next reconnect attempt, doubled after every failure
+        self.retry_delay = RECONNECT_MIN_DELAY
+        self._task: Optional[asyncio.Task] = None
+
+    def get_state(self, entity_id: str) -> Optional[dict]:
+        """Return the cached state in the same format as the REST API, or None."""
+        return self.states.get(entity_id)
+
+    async def wait_for_change(self, timeout: float) -> bool:
+        """
+        Wait until one of the entities changed.
+
+        Args:
+            timeout (float): Maximum number of seconds to wait
+
+        Returns:
+            bool: True if a change arrived, False if the timeout expired
+        """
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._changed.clear()
+        return True
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="ha-websocket")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        self.retry_delay = RECONNECT_MIN_DELAY
+        while True:
+            try:
+                await self._connect()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Home Assistant WebSocket error: {e}")
+            finally:
+                self.connected = False
+
+            # Exponential backoff with jitter, so stations don't reconnect in lockstep
+            wait = self.retry_delay * random.uniform(0.5, 1.5)
+            self.retry_delay = min(self.retry_delay * 2, RECONNECT_MAX_DELAY)
+            logger.info(f"Reconnecting to Home Assistant in {wait:.1f}s")
+            await asyncio.sleep(wait)
+
+    def _next_id(self) -> int:
+        self._message_id += 1
+        return self._message_id
+
+    async def _connect(self) -> None:
+        session = await get_session()
+        async with session.ws_connect(self.url, heartbeat=30) as ws:
+            await self._authenticate(ws)
+
+            self._message_id = 0
+            subscription_id = self._next_id()
+            await ws.send_json(
+                {"id": subscription_id, "type": "subscribe_entities", "entity_ids": self.entity_ids}
+            )
+
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    break
+                self._handle(msg.json(), subscription_id)
+        logger.warning("Home Assistant closed the WebSocket connection")
+
+    async def _authenticate(self, ws: aiohttp.ClientWebSocketResponse) -> None:
+        message = await ws.receive_json()
+        if message.get("type") != "auth_required":
+            raise RuntimeError(f"Unexpected message before authentication: {message}")
+        await ws.send_json({"type": "auth", "access_token": HA_TOKEN})
+        message = await ws.receive_json()
+        if message.get("type") != "auth_ok":
+            raise RuntimeError(f"Authentication failed: {message.get('message', message)}")
+        logger.info("Connected to the Home Assistant WebSocket API")
+
+    def _handle(self, message: dict, subscription_id: int) -> None:
+        if message.get("type") == "result":
+            if not message.get("success"):
+                logger.error(f"Home Assistant command {message.get('id')} failed: {message.get('error')}")
+        elif message.get("type") == "event" and message.get("id") == subscription_id:
+            event = message["event"]
+            # The first event adds the current states of all entities, later ones carry changes
+            for entity_id, compressed in event.get("a", {}).items():
+                self.states[entity_id] = expand_state(entity_id, compressed)
+            for entity_id, diff in event.get("c", {}).items():
+                if entity_id in self.states:
+                    apply_diff(self.states[entity_id], diff)
+            for entity_id in event.get("r", []):
+                self.states.pop(entity_id, None)
+            logger.debug(f"States of {', '.join([*event.get('a', {}), *event.get('c', {})])} changed")
+            if not self.connected:
+                # The connection works, start over with a short delay when it drops
+                self.connected = True
+                self.retry_delay = RECONNECT_MIN_DELAY
+            self._changed.set()
+
+
+def _timestamp(value: float) -> str:
+    return datetime.fromtimestamp(value, timezone.utc).isoformat()
+
+
+def expand_state(entity_id: str, compressed: dict) -> dict:
+    """
+    Turn a compressed state of subscribe_entities into the format of the REST API.
+
+    Args:
+        entity_id (str): The entity of the state
+        compressed (dict): State with the keys "s" (state), "a" (attributes),
+                           "lc" (last changed) and "lu" (last updated, if different)
+
+    Returns:
+        dict: The state with entity_id, state, attributes, last_changed and last_updated
+    """
+    last_changed = compressed.get("lc", 0.0)
+    return {
+        "entity_id": entity_id,
+        "state": compressed.get("s"),
+        "attributes": dict(compressed.get("a", {})),
+        "last_changed": _timestamp(last_changed),
+        "last_updated": _timestamp(compressed.get("lu", last_changed)),
+    }
+
+
+def apply_diff(state: dict, diff: dict) -> None:
+    """Apply a compressed change of subscribe_entities to a state in the REST format."""
+    added = diff.get("+", {})
+    if "s" in added:
+        state["state"] = added["s"]
+    state["attributes"].update(added.get("a", {}))
+    for name in diff.get("-", {}).get("a", []):
+        state["attributes"].pop(name, None)
+    if "lc" in added:
+        state["last_changed"] = _timestamp(added["lc"])
+        state["last_updated"] = state["last_changed"]
+    if "lu" in added:
+        state["last_updated"] = _timestamp(added["lu"])
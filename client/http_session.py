@@ -0,0 +1,66 @@
+import os
+import sys
+from pathlib import Path
+from typing import Optional
+
+import aiohttp
+from dotenv import load_dotenv
+
+# Add project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+from common.logging_config import logger
+
+logger = logger.getChild(__name__)
+load_dotenv()
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 10))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_LIMIT = int(os.getenv("HTTP_LIMIT", 16))
+HTTP_LIMIT_PER_HOST = int(os.getenv("HTTP_LIMIT_PER_HOST", 4))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", 60))
+
+
+class SessionManager:
+    def __init__(self) -> None:
+        """
+        Owns the one aiohttp session shared by all network code of the client.
+
+        Connections to Home Assistant and the card servers are kept alive and
+        reused, so a cycle does not pay DNS, TCP and TLS handshakes again.
+        """
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def get(self) -> aiohttp.ClientSession:
+        """Return the shared session, creating it on first use."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_LIMIT,
+                limit_per_host=HTTP_LIMIT_PER_HOST,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=300,
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=HTTP_TIMEOUT, sock_connect=HTTP_CONNECT_TIMEOUT
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            logger.debug("Created shared HTTP session")
+        return self._session
+
+    async def close(self) -> None:
+        """Close the session and all pooled connections."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+sessions = SessionManager()
+
+
+async def get_session() -> aiohttp.ClientSession:
+    return await sessions.get()
+
+
+async def close_session() -> None:
+    await sessions.close()
@@ -3,12 +3,22 @@ import os
 from pathlib import Path
 import signal
 
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import sys
+import time
 
 from display import Display
 from dotenv import load_dotenv
-from ha_client import get_thermometer_data
+from ha_client import (
+    get_forecast,
+    get_history,
+    get_thermometer_data,
+    get_thermometer_entities,
+    get_weather_data,
+)
+from ha_websocket import HomeAssistantWebSocket
+from http_session import close_session
+from sensor_history import SensorHistory
 from weather_card_downloader import WeatherCardDownloader
 
 # Add project root to Python path
@@ -16,6 +26,7 @@ project_root = str(Path(__file__).parent.parent)
 if project_root not in sys.path:
     sys.path.append(project_root)
 from common.logging_config import logger
+from common.weather_card_renderer import WeatherCardRenderer
 
 logger = logger.getChild(__name__)
 load_dotenv()
@@ -24,8 +35,40 @@ load_dotenv()
 display = Display()
 device_base = os.getenv("DEVICE_BASE", "sensor.temp_carport")
 HA_URL = os.getenv("HA_URL")
+USE_WEBSOCKET = os.getenv("HA_WEBSOCKET", "true").lower() == "true"
+# Set to an empty value to keep the history in memory only
+HISTORY_PATH = os.getenv("HISTORY_PATH", "sensor_history.npz")
+HISTORY_BACKFILL_HOURS = float(os.getenv("HISTORY_BACKFILL_HOURS", 168))
+SPARKLINE_HOURS = float(os.getenv("SPARKLINE_HOURS", 24))
+# "server" downloads the card and draws it natively only when no server answers,
+# "native" always draws it from the weather entity
+CARD_MODE = os.getenv("WEATHER_CARD_MODE", "server").lower()
+# Seconds between fetches of the weather entity for the native card
+NATIVE_CARD_INTERVAL = float(os.getenv("NATIVE_CARD_INTERVAL", 300))
 
-downloader = WeatherCardDownloader("weather_card.png")
+# The card is kept in memory only, nothing is written to the SD card
+downloader = WeatherCardDownloader(output_path=None)
+
+# Thermometer changes are pushed over the WebSocket API, REST is the fallback
+thermometer_entities = get_thermometer_entities(device_base)
+ha_websocket = (
+    HomeAssistantWebSocket(thermometer_entities.values()) if USE_WEBSOCKET else None
+)
+
+history = SensorHistory(HISTORY_PATH or None)
+
+# Strip at the bottom of the screen that holds the clock
+CLOCK_AREA = (0, 200, display.width, display.height)
+# Strip between the temperature and the card that holds the temperature sparkline
+SPARKLINE_AREA = (0, 52, display.width, 78)
+# Top edge of the card, it is visible down to the clock
+CARD_TOP = 80
+
+card_renderer = WeatherCardRenderer(
+    size=(display.width, CLOCK_AREA[1] - CARD_TOP), font_path=display.graphics.font_path
+)
+native_card = None
+native_card_at = 0.0
 
 
 def get_datetime():
@@ -33,42 +76,166 @@ def get_datetime():
 
 
 async def download_weather_card():
-    """Download the weather card image from the server."""
+    """Download and decode the weather card image from the server."""
     return await downloader.download()
 
 
+async def render_weather_card():
+    """
+    Draw the weather card from the weather entity, without a card server.
+
+    The entity and its forecast are fetched at most every NATIVE_CARD_INTERVAL
+    seconds, the renderer only draws again when they changed.
+    """
+    global native_card, native_card_at
+    if native_card is not None and time.monotonic() - native_card_at < NATIVE_CARD_INTERVAL:
+        return native_card
+
+    weather_data = await get_weather_data()
+    if not weather_data:
+        return native_card
+    forecast = await get_forecast()
+    native_card = card_renderer.render(weather_data, forecast)
+    native_card_at = time.monotonic()
+    return native_card
+
+
+async def get_weather_card():
+    """Get the weather card in the configured mode, drawing it natively if no server answers."""
+    if CARD_MODE == "native":
+        return await render_weather_card()
+    weather_card = await download_weather_card()
+    if weather_card is None:
+        logger.warning("No card server reachable, drawing the weather card natively")
+        weather_card = await render_weather_card()
+    return weather_card
+
+
+async def read_thermometer_data():
+    """Read the thermometer from the pushed states, or over REST while they are not available."""
+    if ha_websocket and ha_websocket.connected:
+        return {
+            name: ha_websocket.get_state(entity_id)
+            for name, entity_id in thermometer_entities.items()
+        }
+    return await get_thermometer_data(device_base)
+
+
+async def wait_for_tick():
+    """
+    Sleep until the next clock tick.
+
+    Returns:
+        bool: True if the thermometer changed in the meantime
+    """
+    if ha_websocket:
+        return await ha_websocket.wait_for_change(1)
+    await asyncio.sleep(1)
+    return False
+
+
+async def backfill_history():
+    """Load the saved history and fetch what is missing since then from Home Assistant."""
+    history.load()
+    now = datetime.now(timezone.utc)
+    start = now - timedelta(hours=HISTORY_BACKFILL_HOURS)
+    newest = [history.newest_time(entity_id) for entity_id in thermometer_entities.values()]
+    if all(newest):
+        start = max(start, datetime.fromtimestamp(min(newest), timezone.utc))
+
+    for entity_id, states in (await get_history(thermometer_entities.values(), start)).items():
+        history.extend(entity_id, states)
+
+
 async def main():
+    if ha_websocket:
+        ha_websocket.start()
+    if CARD_MODE != "native":
+        downloader.start()
+    try:
+        await backfill_history()
+        await run_display_loop()
+    finally:
+        if ha_websocket:
+            await ha_websocket.stop()
+        await downloader.stop()
+        if history.changed:
+            history.save()
+        # Close pooled keep-alive connections on shutdown
+        await close_session()
+
+
+async def update_thermometer() -> str:
+    """Read the thermometer and record it in the history, return the temperature to show."""
+    thermometer_data = await read_thermometer_data()
+    if not thermometer_data or not thermometer_data["temperature"]:
+        logger.error("Failed to get temperature data")
+        display.set_led(1, 0, 0)  # Red LED for error
+        return "error"
+
+    display.set_led(0, 0, 0)  # Green LED for success
+    for state in thermometer_data.values():
+        history.record(state)
+    if history.save_due():
+        await asyncio.to_thread(history.save, history.snapshot())
+    return thermometer_data["temperature"]["state"]
+
+
+async def update_weather_card():
+    """Get the weather card, it is only decoded again when the server sent a new version."""
+    weather_card = await get_weather_card()
+    if not weather_card:
+        logger.error("Failed to update weather card")
+        display.set_led(1, 0, 0)  # Red LED for error
+    else:
+        display.set_led(0, 0, 0)  # Green LED for success
+    return weather_card
+
+
+def compose_background(current_temp: str, weather_card):
+    """
+    Draw the temperature, its sparkline and the card, which only change once per cycle.
+
+    Returns:
+        Image.Image: The composed screen, used as background layer for the clock
+    """
+    display.clear()
+    display.graphics.draw_text_centered_horizontal(f"{current_temp}°C", 5, 40)
+    now = time.time()
+    lows, highs = history.downsample(
+        thermometer_entities["temperature"],
+        now - SPARKLINE_HOURS * 3600,
+        now,
+        SPARKLINE_AREA[2] - SPARKLINE_AREA[0],
+    )
+    display.graphics.draw_sparkline(lows, highs, SPARKLINE_AREA)
+    if weather_card:
+        display.graphics.draw_image(weather_card, 0, CARD_TOP, 1.0)
+    return display.graphics.snapshot()
+
+
+def draw_clock(background, text: str) -> None:
+    """Stamp the clock onto the background, only the clock strip is redrawn."""
+    display.graphics.restore(background, CLOCK_AREA)
+    display.graphics.draw_text(text, 34, 205, 24)
+
+
+async def run_display_loop():
     logger.info("Weather station started")
     display.set_backlight(0.5)  # Set display brightness to 50%
     display.graphics.draw_text("Starting...")
 
     while True:
-        # Get current temperature from thermometer
-        thermometer_data = await get_thermometer_data(device_base)
-        if not thermometer_data or not thermometer_data["temperature"]:
-            logger.error("Failed to get temperature data")
-            display.set_led(1, 0, 0)  # Red LED for error
-            current_temp = "error"
-        else:
-            current_temp = thermometer_data["temperature"]["state"]
-            display.set_led(0, 0, 0)  # Green LED for success
-
-        # Update weather card image
-        weather_card_path = await download_weather_card()
-        if not weather_card_path:
-            logger.error("Failed to update weather card")
-            display.set_led(1, 0, 0)  # Red LED for error
-        else:
-            display.set_led(0, 0, 0)  # Green LED for success
+        current_temp = await update_thermometer()
+        weather_card = await update_weather_card()
+        background = compose_background(current_temp, weather_card)
 
         for _ in range(15):
-            display.clear()
-            display.graphics.draw_text_centered_horizontal(f"{current_temp}°C", 5, 40)
-            if weather_card_path:
-                display.graphics.draw_image(weather_card_path, 0, 80, 1.0)
-            display.graphics.draw_text(get_datetime(), 34, 205, 24)
+            draw_clock(background, get_datetime())
             display.display()
-            await asyncio.sleep(1)
+            if await wait_for_tick() or downloader.card_changed:
+                # A new reading or card was announced, compose the background again right away
+                break
 
 
 def signal_handler(sig, frame):
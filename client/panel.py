@@ -0,0 +1,75 @@
+import os
+from abc import ABC, abstractmethod
+from typing import Tuple
+
+from dotenv import load_dotenv
+from PIL import Image
+
+load_dotenv()
+
+# "displayhatmini" drives the Display HAT Mini, "virtual" keeps the frames in memory
+DISPLAY_BACKEND = os.getenv("DISPLAY_BACKEND", "displayhatmini").lower()
+
+# Inclusive bounds in panel coordinates, as set with the controller's address window
+Window = Tuple[int, int, int, int]
+
+
+class Panel(ABC):
+    """
+    A display panel driven by an ST7789 style controller.
+
+    The panel is mounted upside down, so windows are given in panel
+    coordinates, while full frames are given as the screen shows them.
+    """
+
+    width: int
+    height: int
+
+    def set_led(self, r: float, g: float, b: float) -> None:
+        """Set the status LED, panels without one ignore it."""
+
+    def set_backlight(self, brightness: float) -> None:
+        """Set the backlight between 0.0 and 1.0, panels without one ignore it."""
+
+    @abstractmethod
+    def show(self, image: Image.Image) -> None:
+        """
+        Send a full frame.
+
+        Args:
+            image (Image.Image): The frame as the screen shows it
+        """
+
+    @abstractmethod
+    def write_window(self, window: Window, data: bytes) -> None:
+        """
+        Write pixels into an area of the panel.
+
+        Args:
+            window (Window): Inclusive bounds (x0, y0, x1, y1) in panel coordinates
+            data (bytes): Big-endian RGB565 pixels of the area, row by row
+        """
+
+
+def create_panel(backend: str = DISPLAY_BACKEND) -> Panel:
+    """
+    Create the configured panel.
+
+    The backends are imported here, so the virtual panel does not need the
+    Display HAT Mini library and its GPIO and SPI dependencies.
+
+    Args:
+        backend (str): "displayhatmini" or "virtual"
+
+    Returns:
+        Panel: The panel
+    """
+    if backend == "virtual":
+        from virtual_panel import VirtualPanel
+
+        return VirtualPanel()
+    if backend == "displayhatmini":
+        from displayhatmini_panel import DisplayHATMiniPanel
+
+        return DisplayHATMiniPanel()
+    raise ValueError(f"Unknown display backend {backend!r}, use 'displayhatmini' or 'virtual'")
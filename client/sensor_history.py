@@ -0,0 +1,259 @@
+import io
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+# Add project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+from common.logging_config import logger
+
+logger = logger.getChild(__name__)
+load_dotenv()
+
+# Readings kept per sensor, a week of one reading every 30 seconds
+HISTORY_CAPACITY = int(os.getenv("HISTORY_CAPACITY", 20160))
+# Seconds between writes of the history to disk
+HISTORY_SAVE_INTERVAL = float(os.getenv("HISTORY_SAVE_INTERVAL", 900))
+
+
+class RingBuffer:
+    def __init__(self, capacity: int):
+        """
+        Fixed size buffer of (time, value) readings that overwrites the oldest ones.
+
+        Times are whole seconds since the epoch and values 32 bit floats, so a
+        reading takes 8 bytes.
+
+        Args:
+            capacity (int): Maximum number of readings
+        """
+        self.times = np.zeros(capacity, dtype=np.uint32)
+        self.values = np.zeros(capacity, dtype=np.float32)
+        self.start = 0
+        self.count = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self.times)
+
+    def newest_time(self) -> Optional[int]:
+        if self.count == 0:
+            return None
+        return int(self.times[(self.start + self.count - 1) % self.capacity])
+
+    def extend(self, times: np.ndarray, values: np.ndarray) -> int:
+        """
+        Append readings in bulk, skipping those not newer than the newest one stored.
+
+        Args:
+            times (np.ndarray): Seconds since the epoch, ascending
+            values (np.ndarray): The readings
+
+        Returns:
+            int: Number of readings appended
+        """
+        newest = self.newest_time()
+        if newest is not None:
+            keep = times > newest
+            times, values = times[keep], values[keep]
+        # Only the last `capacity` readings can survive
+        times, values = times[-self.capacity :], values[-self.capacity :]
+        if len(times) == 0:
+            return 0
+
+        positions = (self.start + self.count + np.arange(len(times))) % self.capacity
+        self.times[positions] = times
+        self.values[positions] = values
+        overflow = max(0, self.count + len(times) - self.capacity)
+        self.start = (self.start + overflow) % self.capacity
+        self.count = min(self.count + len(times), self.capacity)
+        return len(times)
+
+    def append(self, timestamp: float, value: float) -> bool:
+        return self.extend(np.array([timestamp], dtype=np.uint32), np.array([value])) > 0
+
+    def ordered(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return copies of the stored times and values, oldest first."""
+        positions = (self.start + np.arange(self.count)) % self.capacity
+        return self.times[positions], self.values[positions]
+
+
+def parse_state(state: dict) -> Optional[Tuple[float, float]]:
+    """
+    Turn a Home Assistant state into a reading.
+
+    Returns:
+        Optional[Tuple[float, float]]: Time of the last change and the value, None if the
+                                       state is not numeric, e.g. "unavailable"
+    """
+    try:
+        value = float(state["state"])
+        changed = datetime.fromisoformat(state["last_changed"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+    return changed, value
+
+
+def downsample(
+    times: np.ndarray, values: np.ndarray, start: float, end: float, width: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reduce readings to the lowest and highest value per pixel column.
+
+    A sensor only reports changes, so a column without readings holds the last
+    value before it. Columns before the first reading are NaN.
+
+    Args:
+        times (np.ndarray): Seconds since the epoch, ascending
+        values (np.ndarray): The readings
+        start (float): Time at the left edge
+        end (float): Time at the right edge
+        width (int): Number of columns
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Lowest and highest value of every column
+    """
+    lows = np.full(width, np.nan)
+    highs = np.full(width, np.nan)
+
+    # The last reading before the window is the value at its left edge
+    first = max(int(np.searchsorted(times, start, side="right")) - 1, 0)
+    times, values = times[first:], values[first:]
+    columns = ((times.astype(np.float64) - start) * (width / (end - start))).astype(np.intp)
+    columns = np.clip(columns, 0, None)
+    inside = columns < width
+    columns, values = columns[inside], values[inside]
+    if len(columns) == 0:
+        return lows, highs
+
+    # Readings are sorted, so every column's readings form one run
+    runs = np.flatnonzero(np.diff(columns, prepend=-1))
+    occupied = columns[runs]
+    lows[occupied] = np.minimum.reduceat(values, runs)
+    highs[occupied] = np.maximum.reduceat(values, runs)
+
+    # Fill empty columns with the last value of the closest occupied column to their left
+    last = values[np.append(runs[1:], len(values)) - 1]
+    owner = np.full(width, -1)
+    owner[occupied] = np.arange(len(occupied))
+    owner = np.maximum.accumulate(owner)
+    empty = np.isnan(lows) & (owner >= 0)
+    lows[empty] = highs[empty] = last[owner[empty]]
+    return lows, highs
+
+
+class SensorHistory:
+    def __init__(self, path: Optional[str] = "sensor_history.npz", capacity: int = HISTORY_CAPACITY):
+        """
+        Readings of the station's sensors, persisted to disk from time to time.
+
+        Args:
+            path (str, optional): File the history is kept in, nothing is written if None
+            capacity (int): Readings kept per sensor
+        """
+        self.path = path
+        self.capacity = capacity
+        self.buffers: Dict[str, RingBuffer] = {}
+        self.saved_at = time.monotonic()
+        self.changed = False
+
+    def _buffer(self, entity_id: str) -> RingBuffer:
+        if entity_id not in self.buffers:
+            self.buffers[entity_id] = RingBuffer(self.capacity)
+        return self.buffers[entity_id]
+
+    def newest_time(self, entity_id: str) -> Optional[int]:
+        buffer = self.buffers.get(entity_id)
+        return buffer.newest_time() if buffer else None
+
+    def record(self, state: Optional[dict]) -> None:
+        """Add a Home Assistant state, if it is numeric and changed since the last one."""
+        if not state:
+            return
+        reading = parse_state(state)
+        if reading and self._buffer(state["entity_id"]).append(*reading):
+            self.changed = True
+
+    def extend(self, entity_id: str, states: Iterable[dict]) -> None:
+        """Add many Home Assistant states of one entity at once, e.g. from the history API."""
+        readings = sorted(r for r in map(parse_state, states) if r)
+        if not readings:
+            return
+        times, values = np.array(readings).T
+        added = self._buffer(entity_id).extend(times.astype(np.uint32), values)
+        if added:
+            logger.info(f"Added {added} readings of {entity_id} to the history")
+            self.changed = True
+
+    def downsample(
+        self, entity_id: str, start: float, end: float, width: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Lowest and highest value of an entity per pixel column, see `downsample`."""
+        times, values = self._buffer(entity_id).ordered()
+        return downsample(times, values, start, end, width)
+
+    def load(self) -> None:
+        """Read the history written by `save`, if there is one."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                for name in data.files:
+                    entity_id, kind = name.rsplit(":", 1)
+                    if kind == "times":
+                        self._buffer(entity_id).extend(
+                            data[name], data[f"{entity_id}:values"]
+                        )
+            logger.info(f"Loaded history of {len(self.buffers)} sensors from {self.path}")
+        except Exception as e:
+            logger.error(f"Failed to load history from {self.path}: {str(e)}")
+
+    def snapshot(self) -> Dict[str, np.ndarray]:
+        """
+        Copy the readings for `save`, so they can be written in another thread.
+
+        Readings recorded after the snapshot count as unsaved.
+        """
+        self.saved_at = time.monotonic()
+        self.changed = False
+        arrays = {}
+        for entity_id, buffer in self.buffers.items():
+            arrays[f"{entity_id}:times"], arrays[f"{entity_id}:values"] = buffer.ordered()
+        return arrays
+
+    def save_due(self) -> bool:
+        """Whether the history changed and was not written for HISTORY_SAVE_INTERVAL."""
+        return (
+            bool(self.path)
+            and self.changed
+            and time.monotonic() - self.saved_at >= HISTORY_SAVE_INTERVAL
+        )
+
+    def save(self, arrays: Optional[Dict[str, np.ndarray]] = None) -> None:
+        """
+        Write the history to disk, replacing the previous file atomically.
+
+        Args:
+            arrays (Dict[str, np.ndarray], optional): A snapshot to write, taken now if None
+        """
+        if not self.path:
+            return
+        if arrays is None:
+            arrays = self.snapshot()
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(buffer.getvalue())
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.error(f"Failed to save history to {self.path}: {str(e)}")
@@ -0,0 +1,113 @@
+import os
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+# Add project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+from common.logging_config import logger
+
+logger = logger.getChild(__name__)
+load_dotenv()
+
+# Weight of the newest sample in the latency and error rate averages
+EWMA_ALPHA = float(os.getenv("WEATHER_CARD_EWMA_ALPHA", 0.3))
+# Consecutive failures after which a server is skipped
+BREAKER_THRESHOLD = int(os.getenv("WEATHER_CARD_BREAKER_THRESHOLD", 3))
+# Seconds a failing server is skipped before it gets another try
+BREAKER_COOLDOWN = float(os.getenv("WEATHER_CARD_BREAKER_COOLDOWN", 30))
+
+
+@dataclass
+class ServerStats:
+    url: str
+    latency: Optional[float] = None
+    error_rate: float = 0.0
+    failures: int = 0
+    open_until: float = 0.0
+
+    def is_open(self, now: float) -> bool:
+        """Whether the circuit breaker currently skips this server."""
+        return now < self.open_until
+
+    def score(self) -> float:
+        """Expected cost of a request, lower is better. Untried servers go first."""
+        if self.latency is None:
+            return float("inf") if self.failures else 0.0
+        return self.latency / max(1.0 - self.error_rate, 0.05)
+
+
+class ServerPool:
+    def __init__(self, urls: List[str]):
+        """
+        Track how the card servers perform and order them for the next request.
+
+        Every server keeps an exponentially weighted average of its latency and
+        error rate. A server that fails BREAKER_THRESHOLD times in a row is
+        skipped for BREAKER_COOLDOWN seconds, after which a single request
+        decides whether it is healthy again.
+
+        Args:
+            urls (List[str]): The server URLs, in the configured order
+        """
+        self.stats: Dict[str, ServerStats] = {url: ServerStats(url) for url in urls}
+
+    def candidates(self) -> List[ServerStats]:
+        """
+        Return the servers to try, best first.
+
+        Returns:
+            List[ServerStats]: Servers with a closed breaker ordered by score. If every
+                               breaker is open, all servers ordered by when they reopen.
+        """
+        now = time.monotonic()
+        # sorted is stable, so ties keep the configured order
+        closed = sorted(
+            (s for s in self.stats.values() if not s.is_open(now)), key=ServerStats.score
+        )
+        if closed:
+            return closed
+        return sorted(self.stats.values(), key=lambda s: s.open_until)
+
+    def record_latency(self, url: str, latency: float) -> None:
+        """Add a latency sample, also used for requests abandoned after `latency` seconds."""
+        stats = self.stats[url]
+        if stats.latency is None:
+            stats.latency = latency
+        else:
+            stats.latency += EWMA_ALPHA * (latency - stats.latency)
+
+    def record_success(self, url: str, latency: float) -> None:
+        self.record_latency(url, latency)
+        stats = self.stats[url]
+        stats.error_rate -= EWMA_ALPHA * stats.error_rate
+        if stats.failures >= BREAKER_THRESHOLD:
+            logger.info(f"Server {url} recovered")
+        stats.failures = 0
+        stats.open_until = 0.0
+
+    def record_timeout(self, url: str, latency: float) -> None:
+        """
+        Record a request that was abandoned after it exceeded the hedge delay.
+
+        A server that hangs without erroring loses every race to the hedge, so
+        it counts as failed, otherwise its score would never get worse.
+        """
+        self.record_latency(url, latency)
+        self.record_failure(url)
+
+    def record_failure(self, url: str) -> None:
+        stats = self.stats[url]
+        stats.error_rate += EWMA_ALPHA * (1.0 - stats.error_rate)
+        stats.failures += 1
+        if stats.failures >= BREAKER_THRESHOLD:
+            stats.open_until = time.monotonic() + BREAKER_COOLDOWN
+            logger.warning(
+                f"Skipping server {url} for {BREAKER_COOLDOWN}s after {stats.failures} failures"
+            )
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add the client modules and the fake Home Assistant to the Python path
+repo_root = Path(__file__).parent.parent.parent
+for directory in (repo_root / "client", repo_root / "benchmark"):
+    if str(directory) not in sys.path:
+        sys.path.insert(0, str(directory))
+os.environ.setdefault("HA_URL", "http://127.0.0.1:8123")
+os.environ.setdefault("HA_TOKEN", "benchmark-token")
+
+import ha_websocket
+from fake_home_assistant import DEFAULT_TOKEN, WEATHER_ENTITY, FakeHomeAssistant
+from ha_websocket import HomeAssistantWebSocket
+from http_session import close_session
+from sensor_history import parse_state
+
+SENSORS = [
+    "sensor.test_temperature",
+    "sensor.test_humidity",
+    "sensor.test_pressure",
+]
+
+
+async def wait_until(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Condition not met in time")
+        await asyncio.sleep(0.01)
+
+
+def run_with_fake(test, token: str = DEFAULT_TOKEN, **settings):
+    """Run a test against a fake Home Assistant, with short reconnect delays."""
+    ha_websocket.HA_TOKEN = token
+    ha_websocket.RECONNECT_MIN_DELAY = 0.02
+    ha_websocket.RECONNECT_MAX_DELAY = 0.08
+
+    async def run():
+        fake = FakeHomeAssistant(push_interval=0.02, **settings)
+        url = await fake.start()
+        client = HomeAssistantWebSocket(SENSORS, url=f"{url.replace('http', 'ws', 1)}/api/websocket")
+        client.start()
+        try:
+            await test(fake, client)
+        finally:
+            await client.stop()
+            await close_session()
+            await fake.stop()
+
+    asyncio.run(run())
+
+
+def test_authenticates_and_receives_only_subscribed_states():
+    async def test(fake, client):
+        await wait_until(lambda: client.connected)
+        assert sorted(client.states) == sorted(SENSORS)
+        assert client.get_state(WEATHER_ENTITY) is None
+
+        state = client.get_state("sensor.test_temperature")
+        assert state["entity_id"] == "sensor.test_temperature"
+        assert state["attributes"]["unit_of_measurement"] == "°C"
+        # The compressed state becomes a reading like a state of the REST API
+        assert parse_state(state) is not None
+
+    run_with_fake(test)
+
+
+def test_invalid_token_backs_off_without_connecting():
+    async def test(fake, client):
+        await wait_until(lambda: fake.websocket_auth_failures >= 3)
+        assert not client.connected
+        assert client.states == {}
+        assert client.retry_delay == ha_websocket.RECONNECT_MAX_DELAY
+
+    run_with_fake(test, token="wrong-token")
+
+
+def test_pushes_state_changes():
+    async def test(fake, client):
+        await wait_until(lambda: client.connected)
+        client._changed.clear()
+
+        fake.set_state("sensor.test_temperature", "21.5")
+        assert await client.wait_for_change(5)
+        state = client.get_state("sensor.test_temperature")
+        assert state["state"] == "21.5"
+        assert state["attributes"]["unit_of_measurement"] == "°C"
+
+        fake.set_state("sensor.test_humidity", "40", attributes={})
+        await wait_until(lambda: client.get_state("sensor.test_humidity")["state"] == "40")
+        assert client.get_state("sensor.test_humidity")["attributes"] == {}
+
+    run_with_fake(test)
+
+
+def test_reconnects_after_home_assistant_restarts():
+    async def test(fake, client):
+        await wait_until(lambda: client.connected)
+        assert fake.websocket_connections == 1
+
+        await fake.disconnect_websockets()
+        await wait_until(lambda: not client.connected)
+        fake.set_state("sensor.test_pressure", "990.0")
+
+        await wait_until(lambda: client.connected)
+        assert fake.websocket_connections == 2
+        assert client.retry_delay == ha_websocket.RECONNECT_MIN_DELAY
+        # The states are sent again with the new subscription
+        assert client.get_state("sensor.test_pressure")["state"] == "990.0"
+
+    run_with_fake(test)
@@ -0,0 +1,122 @@
+import asyncio
+import io
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from aiohttp import web
+from PIL import Image
+
+# Add the client modules to the Python path
+client_dir = str(Path(__file__).parent.parent)
+if client_dir not in sys.path:
+    sys.path.insert(0, client_dir)
+import weather_card_downloader
+from http_session import close_session
+from weather_card_downloader import WeatherCardDownloader
+
+ERROR_PAGE = b"<html><body>502 Bad Gateway</body></html>"
+
+
+def card_png() -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", (32, 12), (40, 80, 120)).save(output, format="PNG")
+    return output.getvalue()
+
+
+def serve_card(requests: List[str]) -> Callable:
+    async def handler(request: web.Request) -> web.Response:
+        requests.append("card")
+        return web.Response(body=card_png(), content_type="image/png", headers={"ETag": '"v1"'})
+
+    return handler
+
+
+def serve_error_page(requests: List[str]) -> Callable:
+    async def handler(request: web.Request) -> web.Response:
+        requests.append("error page")
+        # A proxy in front of a dead server answers 200 with its own page
+        return web.Response(body=ERROR_PAGE, content_type="text/html")
+
+    return handler
+
+
+async def start_servers(*handlers: Callable) -> Tuple[List[web.AppRunner], List[str]]:
+    runners, urls = [], []
+    for handler in handlers:
+        app = web.Application()
+        app.router.add_get("/weather-card", handler)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        runners.append(runner)
+        urls.append(f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}")
+    return runners, urls
+
+
+def run_with_servers(test, *handlers: Callable) -> None:
+    async def run():
+        runners, urls = await start_servers(*handlers)
+        weather_card_downloader.SERVER_URLS = ",".join(urls)
+        try:
+            await test(WeatherCardDownloader(output_path=None), urls)
+        finally:
+            await close_session()
+            for runner in runners:
+                await runner.cleanup()
+
+    asyncio.run(run())
+
+
+def test_undecodable_card_fails_over_to_the_next_server():
+    requests = []
+
+    async def test(downloader, urls):
+        image = await downloader.download()
+        assert image is not None and image.size == (32, 12)
+        assert requests == ["error page", "card"]
+        assert downloader.pool.stats[urls[0]].failures == 1
+        assert downloader.pool.stats[urls[1]].failures == 0
+
+    run_with_servers(test, serve_error_page(requests), serve_card(requests))
+
+
+def test_undecodable_card_from_every_server_returns_none():
+    requests = []
+
+    async def test(downloader, urls):
+        assert await downloader.download() is None
+        assert downloader.image is None
+        assert all(downloader.pool.stats[url].failures == 1 for url in urls)
+
+    run_with_servers(test, serve_error_page(requests), serve_error_page(requests))
+
+
+def test_failed_download_backs_off_instead_of_announcing_a_change():
+    requests = []
+
+    async def test(downloader, urls):
+        # Subscribed to updates, and a new version was announced
+        downloader.subscribed = True
+        downloader.update_available = True
+        assert downloader.card_changed
+
+        assert await downloader.download() is None
+        assert requests == ["error page"]
+        # The display loop is not woken up again for the failed version
+        assert not downloader.card_changed
+        assert await downloader.download() is None
+        assert requests == ["error page"]
+
+        # A newer version waits for the retry as well
+        downloader.update_available = True
+        assert not downloader.card_changed
+        downloader.retry_at = time.monotonic()
+        assert downloader.card_changed
+        assert await downloader.download() is None
+        assert requests == ["error page", "error page"]
+        assert downloader.retry_delay == 4 * weather_card_downloader.DOWNLOAD_RETRY_MIN
+
+    run_with_servers(test, serve_error_page(requests))
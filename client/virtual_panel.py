@@ -0,0 +1,75 @@
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Tuple
+
+from panel import Panel, Window
+from PIL import Image
+
+# Add project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+from common import rgb565
+
+# CASET and RASET with four parameter bytes each, and RAMWR, sent before the pixels
+WINDOW_COMMAND_BYTES = 11
+
+
+@dataclass
+class PanelWrite:
+    window: Window
+    pixel_bytes: int
+
+    @property
+    def spi_bytes(self) -> int:
+        return self.pixel_bytes + WINDOW_COMMAND_BYTES
+
+
+class VirtualPanel(Panel):
+    def __init__(self, size: Tuple[int, int] = (320, 240)):
+        """
+        A panel in memory, to run the station on a machine without a Display HAT Mini.
+
+        It keeps the frame buffer of the controller in RGB565, like the real
+        panel, and records every write with the bytes it would send over SPI.
+
+        Args:
+            size (Tuple[int, int]): Width and height of the panel
+        """
+        self.width, self.height = size
+        self.framebuffer = bytearray(self.width * self.height * 2)
+        self.led = (0.0, 0.0, 0.0)
+        self.backlight = 0.0
+        self.writes: List[PanelWrite] = []
+
+    def set_led(self, r: float, g: float, b: float) -> None:
+        self.led = (r, g, b)
+
+    def set_backlight(self, brightness: float) -> None:
+        self.backlight = brightness
+
+    def show(self, image: Image.Image) -> None:
+        # Like the driver, rotate the frame to the mounting and convert it
+        self.framebuffer[:] = rgb565.pack(image.transpose(Image.Transpose.ROTATE_180))
+        self.writes.append(PanelWrite((0, 0, self.width - 1, self.height - 1), len(self.framebuffer)))
+
+    def write_window(self, window: Window, data: bytes) -> None:
+        x0, y0, x1, y1 = window
+        row_bytes = (x1 - x0 + 1) * 2
+        if len(data) != row_bytes * (y1 - y0 + 1):
+            raise ValueError(f"{len(data)} bytes do not fill the window {window}")
+        for row in range(y1 - y0 + 1):
+            offset = ((y0 + row) * self.width + x0) * 2
+            self.framebuffer[offset : offset + row_bytes] = data[row * row_bytes : (row + 1) * row_bytes]
+        self.writes.append(PanelWrite(window, len(data)))
+
+    def take_writes(self) -> List[PanelWrite]:
+        """Return the writes since the last call, e.g. those of one frame."""
+        writes, self.writes = self.writes, []
+        return writes
+
+    def frame(self) -> Image.Image:
+        """Return what the panel shows, as the screen shows it."""
+        image = rgb565.unpack(bytes(self.framebuffer), (self.width, self.height))
+        return image.transpose(Image.Transpose.ROTATE_180)
@@ -1,14 +1,22 @@
 import asyncio
+import io
 import os
 from pathlib import Path
+import random
 import sys
+import time
 import aiohttp
 from dotenv import load_dotenv
+from http_session import HTTP_TIMEOUT, close_session, get_session
+from PIL import Image
+from server_pool import ServerPool
+from typing import Mapping, NamedTuple, Optional
 
 # Add project root to Python path
 project_root = str(Path(__file__).parent.parent)
 if project_root not in sys.path:
     sys.path.append(project_root)
+from common import card_delta, rgb565
 from common.logging_config import logger
 
 logger = logger.getChild(__name__)
@@ -16,69 +24,339 @@ load_dotenv()
 SERVER_URLS = os.getenv("WEATHER_CARD_SERVER_URLS", "http://localhost:8080")
 SERVER_PATH = os.getenv("WEATHER_CARD_SERVER_PATH", "/weather-card")
 API_KEY = os.getenv("API_KEY")
+# "rgb565" skips image decoding on the station, "webp" is the smallest download,
+# "png" and "webp" keep a copy on disk
+CARD_FORMAT = os.getenv("WEATHER_CARD_FORMAT", "png").lower()
+# Ask for only the changed tiles when the server still knows our version
+USE_DELTAS = os.getenv("WEATHER_CARD_DELTAS", "true").lower() == "true"
+# Seconds to wait for a server before the same request is also sent to the next one
+HEDGE_DELAY = float(os.getenv("WEATHER_CARD_HEDGE_DELAY", 0.5))
+# Wait for new card versions with long polls and download only when notified
+SUBSCRIBE = os.getenv("WEATHER_CARD_SUBSCRIBE", "true").lower() == "true"
+# Seconds the server may hold a long poll, it answers earlier when the card changes
+SUBSCRIBE_TIMEOUT = float(os.getenv("WEATHER_CARD_SUBSCRIBE_TIMEOUT", 50))
+SUBSCRIBE_RETRY_MIN = 1.0
+SUBSCRIBE_RETRY_MAX = 60.0
+# Seconds before a failed download is tried again, doubled after every failure
+DOWNLOAD_RETRY_MIN = 5.0
+DOWNLOAD_RETRY_MAX = 300.0
+
+
+class CardResponse(NamedTuple):
+    server_url: str
+    status: int
+    content: bytes
+    content_type: str
+    headers: Mapping[str, str]
+    image: Optional[Image.Image]
 
 
 class WeatherCardDownloader:
-    def __init__(self, output_path: str = "weather_card.png"):
+    def __init__(self, output_path: Optional[str] = "weather_card.png"):
         """
         Initialize the WeatherCardDownloader with a list of server URLs and output path.
 
         Args:
-            output_path (str): Path where the downloaded weather card will be saved
+            output_path (str, optional): Path where downloaded PNG weather cards will be saved.
+                                         The card is only kept in memory if None.
         """
         self.output_path = output_path
         self.servers = self._get_server_urls()
+        self.pool = ServerPool(self.servers)
         self.server_path = SERVER_PATH
         self.headers = {"X-API-Key": API_KEY} if API_KEY else {}
+        if CARD_FORMAT == "rgb565":
+            accept = [rgb565.MEDIA_TYPE]
+        elif CARD_FORMAT == "webp":
+            # Servers without WebP answer with PNG
+            accept = ["image/webp", "image/png;q=0.9"]
+        else:
+            accept = ["image/png"]
+        if USE_DELTAS:
+            accept.insert(0, card_delta.MEDIA_TYPE)
+        self.headers["Accept"] = ", ".join(accept)
+        self.image: Optional[Image.Image] = None
+        self.etag = None
+        self.last_modified = None
+        # Version of the card on the watched server, as reported by its long polls
+        self.version: Optional[str] = None
+        # True while a long poll is answered, downloads then wait for notifications
+        self.subscribed = False
+        self.update_available = True
+        # When the next download may be sent after downloads failed
+        self.retry_at: Optional[float] = None
+        self.retry_delay = DOWNLOAD_RETRY_MIN
+        self._watch_task: Optional[asyncio.Task] = None
 
         logger.info(f"Using servers: {self.servers}, with path: {self.server_path}")
 
+    @property
+    def card_changed(self) -> bool:
+        """Whether the server announced a card version that can be downloaded now."""
+        if self.retry_at is not None and time.monotonic() < self.retry_at:
+            return False
+        return self.subscribed and self.update_available
+
+    def start(self) -> None:
+        """Start watching for new card versions, if WEATHER_CARD_SUBSCRIBE is on."""
+        if SUBSCRIBE and self.servers:
+            self._watch_task = asyncio.create_task(self._watch(), name="weather-card-updates")
+
+    async def stop(self) -> None:
+        if self._watch_task:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+        self.subscribed = False
+
+    async def _poll_version(self, session: aiohttp.ClientSession, server_url: str) -> Optional[str]:
+        """
+        Long poll a server until its card has another version than ours.
+
+        Returns:
+            Optional[str]: The current version, None if the server has no updates endpoint
+        """
+        params = {"timeout": str(SUBSCRIBE_TIMEOUT)}
+        if self.version:
+            params["version"] = self.version
+        async with session.get(
+            f"{server_url}{self.server_path}/updates",
+            params=params,
+            headers={"X-API-Key": API_KEY} if API_KEY else {},
+            # The server holds the request, allow for that on top of the usual timeout
+            timeout=aiohttp.ClientTimeout(total=SUBSCRIBE_TIMEOUT + HTTP_TIMEOUT),
+        ) as response:
+            if response.status == 404:
+                return None
+            response.raise_for_status()
+            return (await response.json())["version"]
+
+    async def _watch(self) -> None:
+        """Keep a long poll open to the best server and flag every new card version."""
+        session = await get_session()
+        retry_delay = SUBSCRIBE_RETRY_MIN
+        while True:
+            server_url = self.pool.candidates()[0].url
+            try:
+                version = await self._poll_version(session, server_url)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Waiting for card updates from {server_url} failed: {e}")
+                # Download on every cycle again until the subscription is back
+                self.subscribed = False
+                self.update_available = True
+                await asyncio.sleep(retry_delay * random.uniform(0.5, 1.0))
+                retry_delay = min(retry_delay * 2, SUBSCRIBE_RETRY_MAX)
+                continue
+
+            if version is None:
+                logger.info(f"{server_url} does not offer card updates, polling the card instead")
+                self.subscribed = False
+                self.update_available = True
+                return
+
+            retry_delay = SUBSCRIBE_RETRY_MIN
+            if not self.subscribed:
+                logger.info(f"Subscribed to card updates from {server_url}")
+                self.subscribed = True
+            if version != self.version:
+                logger.debug(f"Card version {version} is available")
+                self.version = version
+                self.update_available = True
+
     def _get_server_urls(self) -> list:
         """Get list of server URLs from environment variables."""
         servers = [url.strip() for url in SERVER_URLS.split(",") if url.strip()]
         return servers
 
-    async def download(self) -> str:
+    def _conditional_headers(self) -> dict:
+        """Build the request headers, asking for a 304 if our copy is still current."""
+        headers = dict(self.headers)
+        if self.image is not None:
+            if self.etag:
+                headers["If-None-Match"] = self.etag
+            if self.last_modified:
+                headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def _decode(self, content: bytes, content_type: str, headers: Mapping[str, str]) -> Image.Image:
+        """Decode a downloaded card, a delta is applied to the card we have."""
+        if content_type == card_delta.MEDIA_TYPE:
+            image = card_delta.apply(self.image, content)
+            logger.debug(f"Applied {len(content)} byte delta to the weather card")
+            return image
+
+        if content_type == rgb565.MEDIA_TYPE:
+            size = (int(headers["X-Image-Width"]), int(headers["X-Image-Height"]))
+            return rgb565.unpack(content, size)
+
+        with Image.open(io.BytesIO(content)) as image:
+            # Palette PNGs are converted once here instead of on every composition
+            return image.convert("RGB")
+
+    def _save(self, response: CardResponse) -> None:
+        """Write a new card to the output path, if one is set."""
+        if not self.output_path or response.content_type == rgb565.MEDIA_TYPE:
+            return
+        if response.content_type == card_delta.MEDIA_TYPE:
+            if CARD_FORMAT != "rgb565":
+                response.image.save(self.output_path)
+            return
+        with open(self.output_path, "wb") as f:
+            f.write(response.content)
+
+    async def _fetch(
+        self, session: aiohttp.ClientSession, server_url: str, headers: dict, delay: float
+    ) -> Optional[CardResponse]:
         """
-        Download the weather card from the first available server.
+        Request the card from one server and record how it performed.
+
+        The card is decoded here, so a server that answers 200 with something
+        else than a card, like the error page of a proxy, counts as failed.
+
+        Args:
+            delay (float): The hedge delay, a request cancelled after it counts as timed out
 
         Returns:
-            str: Path to the downloaded weather card if successful, None otherwise
+            Optional[CardResponse]: The response with the decoded card if the server
+                                    answered 200 or 304, None otherwise
+        """
+        started = time.monotonic()
+        try:
+            async with session.get(
+                f"{server_url}{self.server_path}", headers=headers
+            ) as response:
+                content = await response.read()
+                if response.status in (200, 304):
+                    if response.status == 200:
+                        image = self._decode(content, response.content_type, response.headers)
+                    else:
+                        image = self.image
+                    self.pool.record_success(server_url, time.monotonic() - started)
+                    return CardResponse(
+                        server_url,
+                        response.status,
+                        content,
+                        response.content_type,
+                        response.headers,
+                        image,
+                    )
+                if response.status == 401:
+                    logger.error(f"Authentication failed for {server_url}")
+                else:
+                    logger.warning(
+                        f"Failed to download from {server_url}: Status {response.status}"
+                    )
+        except asyncio.CancelledError:
+            elapsed = time.monotonic() - started
+            if elapsed >= delay:
+                # Another server answered after this one had exceeded the hedge delay
+                self.pool.record_timeout(server_url, elapsed)
+            else:
+                # Another server answered first, only remember that this one was slower
+                self.pool.record_latency(server_url, elapsed)
+            raise
+        except Exception as e:
+            logger.error(f"Error downloading from {server_url}: {str(e)}")
+        self.pool.record_failure(server_url)
+        return None
+
+    async def _hedged_fetch(self) -> Optional[CardResponse]:
+        """
+        Send the request to the best server, and to the next one whenever the
+        previous did not answer within the hedge delay or failed.
+
+        The first successful response wins and the other requests are cancelled.
+        """
+        session = await get_session()
+        headers = self._conditional_headers()
+        candidates = self.pool.candidates()
+        # Hedge after about twice the usual latency of the best server, bounded by HEDGE_DELAY
+        best_latency = candidates[0].latency
+        delay = HEDGE_DELAY if best_latency is None else min(HEDGE_DELAY, 2 * best_latency)
+
+        waiting = iter(candidates)
+        pending = set()
+        try:
+            while True:
+                server = next(waiting, None)
+                if server is not None:
+                    pending.add(
+                        asyncio.create_task(self._fetch(session, server.url, headers, delay))
+                    )
+                elif not pending:
+                    return None
+
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=delay if server is not None else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    if task.result() is not None:
+                        return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def download(self) -> Optional[Image.Image]:
+        """
+        Download the weather card from the fastest available server.
+
+        Sends a conditional request, so the card is only transferred and decoded
+        when it changed. While subscribed to card updates, no request is sent
+        until the server announced a new version. After a failed download, no
+        request is sent until `retry_at`, which backs off after every failure.
+
+        Returns:
+            Optional[Image.Image]: The decoded weather card if successful, None otherwise
         """
         if not self.servers:
             logger.error("No servers configured for weather card download")
             return None
+        if self.retry_at is not None:
+            if time.monotonic() < self.retry_at:
+                return None
+        elif self.image is not None and self.subscribed and not self.update_available:
+            return self.image
 
-        for server_url in self.servers:
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(
-                        f"{server_url}{self.server_path}",
-                        headers=self.headers
-                    ) as response:
-                        if response.status == 200:
-                            content = await response.read()
-                            with open(self.output_path, "wb") as f:
-                                f.write(content)
-                            logger.debug(
-                                f"Successfully downloaded weather card from {server_url}"
-                            )
-                            return self.output_path
-                        elif response.status == 401:
-                            logger.error(f"Authentication failed for {server_url}")
-                            continue
-                        else:
-                            logger.warning(
-                                f"Failed to download from {server_url}: Status {response.status}"
-                            )
-            except Exception as e:
-                logger.error(f"Error downloading from {server_url}: {str(e)}")
-                continue
+        # The announced version is attempted once, failures are retried by retry_at
+        self.update_available = False
+        response = await self._hedged_fetch()
+        if response is None:
+            wait = self.retry_delay * random.uniform(0.5, 1.0)
+            logger.error(f"Failed to download weather card from all servers, retrying in {wait:.0f}s")
+            self.retry_at = time.monotonic() + wait
+            self.retry_delay = min(self.retry_delay * 2, DOWNLOAD_RETRY_MAX)
+            return None
 
-        logger.error("Failed to download weather card from all servers")
-        return None
+        self.retry_at = None
+        self.retry_delay = DOWNLOAD_RETRY_MIN
+
+        if response.status == 304:
+            logger.debug(f"Weather card not modified on {response.server_url}")
+            return self.image
+
+        self._save(response)
+        self.image = response.image
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+        logger.debug(f"Successfully downloaded weather card from {response.server_url}")
+        return self.image
 
 
 if __name__ == "__main__":
     downloader = WeatherCardDownloader(output_path="weather_card-test.png")
-    asyncio.run(downloader.download())
+
+    async def download_once():
+        try:
+            await downloader.download()
+        finally:
+            await downloader.stop()
+            await close_session()
+
+    asyncio.run(download_once())
@@ -0,0 +1,93 @@
+import io
+import struct
+
+from typing import List, Tuple
+
+from PIL import Image
+
+# A delta holds the tiles that changed between two versions of a card:
+#   header: magic, width, height, tile size, tile count
+#   tile:   x, y, length of the PNG, PNG encoded tile
+MEDIA_TYPE = "application/x-card-delta"
+MAGIC = b"WCD1"
+_HEADER = struct.Struct(">4sHHHH")
+_TILE = struct.Struct(">HHI")
+
+
+def changed_tiles(
+    base: Image.Image, current: Image.Image, tile_size: int
+) -> List[Tuple[int, int, int, int]]:
+    """
+    Find the tiles that differ between two images of the same size.
+
+    Args:
+        base (Image.Image): The version the client has
+        current (Image.Image): The latest version
+        tile_size (int): Edge length of a tile in pixels
+
+    Returns:
+        List[Tuple[int, int, int, int]]: Boxes (left, top, right, bottom) of the changed tiles
+    """
+    base = base.convert("RGB")
+    current = current.convert("RGB")
+    width, height = current.size
+    boxes = []
+    for top in range(0, height, tile_size):
+        for left in range(0, width, tile_size):
+            box = (left, top, min(left + tile_size, width), min(top + tile_size, height))
+            if base.crop(box).tobytes() != current.crop(box).tobytes():
+                boxes.append(box)
+    return boxes
+
+
+def encode(base: Image.Image, current: Image.Image, tile_size: int = 32) -> bytes:
+    """
+    Encode the changes from `base` to `current` as a delta.
+
+    Args:
+        base (Image.Image): The version the client has
+        current (Image.Image): The latest version, same size as `base`
+        tile_size (int): Edge length of a tile in pixels
+
+    Returns:
+        bytes: The encoded delta
+    """
+    if base.size != current.size:
+        raise ValueError("Deltas can only be built between images of the same size")
+
+    boxes = changed_tiles(base, current, tile_size)
+    parts = [_HEADER.pack(MAGIC, current.width, current.height, tile_size, len(boxes))]
+    for box in boxes:
+        tile = io.BytesIO()
+        current.crop(box).save(tile, format="PNG", optimize=True)
+        parts.append(_TILE.pack(box[0], box[1], tile.tell()))
+        parts.append(tile.getvalue())
+    return b"".join(parts)
+
+
+def apply(image: Image.Image, delta: bytes) -> Image.Image:
+    """
+    Apply a delta to the client's copy of the card.
+
+    Args:
+        image (Image.Image): The base version of the card
+        delta (bytes): A delta built against that version
+
+    Returns:
+        Image.Image: A new image with the changed tiles pasted in
+    """
+    magic, width, height, _, count = _HEADER.unpack_from(delta, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a weather card delta")
+    if image.size != (width, height):
+        raise ValueError(f"Delta is for a {width}x{height} card, not {image.width}x{image.height}")
+
+    result = image.convert("RGB")
+    offset = _HEADER.size
+    for _ in range(count):
+        x, y, length = _TILE.unpack_from(delta, offset)
+        offset += _TILE.size
+        with Image.open(io.BytesIO(delta[offset : offset + length])) as tile:
+            result.paste(tile.convert("RGB"), (x, y))
+        offset += length
+    return result
@@ -7,9 +7,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
-# Create log directory if it doesn't exist
 log_dir = os.getenv("LOG_DIR", "log")
-os.makedirs(log_dir, exist_ok=True)
 
 # Configure log level
 log_level = os.getenv("LOG_LEVEL", "INFO").upper()
@@ -32,6 +30,8 @@ def setup_logger(name: str, log_file: str) -> logging.Logger:
         )
 
         if use_log_file_handler == "true":
+            # Create log directory if it doesn't exist
+            os.makedirs(log_dir, exist_ok=True)
             # Time-based rotation (daily at midnight)
             file_handler = TimedRotatingFileHandler(
                 os.path.join(log_dir, log_file),
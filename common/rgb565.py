@@ -0,0 +1,48 @@
+from array import array
+from typing import Tuple
+
+from PIL import Image, ImageChops
+
+# Big-endian RGB565, the pixel format the ST7789 of the Display HAT Mini expects
+MEDIA_TYPE = "application/x-rgb565"
+
+_RED_HIGH = [v & 0xF8 for v in range(256)]
+_GREEN_HIGH = [v >> 5 for v in range(256)]
+_GREEN_LOW = [(v << 3) & 0xE0 for v in range(256)]
+_BLUE_LOW = [v >> 3 for v in range(256)]
+
+
+def pack(image: Image.Image) -> bytes:
+    """
+    Convert an image to big-endian RGB565, row by row from the top left corner.
+
+    Args:
+        image (Image.Image): The image to convert
+
+    Returns:
+        bytes: Two bytes per pixel, RRRRRGGG GGGBBBBB
+    """
+    red, green, blue = image.convert("RGB").split()
+    # The shifted channels never overlap, so adding them is a bitwise or
+    high = ImageChops.add(red.point(_RED_HIGH), green.point(_GREEN_HIGH))
+    low = ImageChops.add(green.point(_GREEN_LOW), blue.point(_BLUE_LOW))
+    # An "LA" image stores its two bands interleaved, one byte each
+    return Image.merge("LA", (high, low)).tobytes()
+
+
+def unpack(data: bytes, size: Tuple[int, int]) -> Image.Image:
+    """
+    Convert big-endian RGB565 data back into an RGB image.
+
+    Args:
+        data (bytes): Two bytes per pixel, as produced by `pack`
+        size (Tuple[int, int]): Width and height of the image
+
+    Returns:
+        Image.Image: The decoded RGB image
+    """
+    pixels = array("H")
+    pixels.frombytes(data)
+    # Pillow only has a little-endian RGB565 decoder, swap the bytes of every pixel
+    pixels.byteswap()
+    return Image.frombytes("RGB", size, pixels.tobytes(), "raw", "BGR;16")
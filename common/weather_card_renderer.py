@@ -0,0 +1,296 @@
+import math
+import os
+from datetime import datetime
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from common.weather_data import Forecast, WeatherData
+
+# Colors of the Home Assistant dark theme
+BACKGROUND = (28, 28, 28)
+PRIMARY = (225, 225, 225)
+SECONDARY = (159, 161, 165)
+SUN = (255, 193, 7)
+MOON = (230, 230, 210)
+CLOUD = (176, 190, 197)
+DARK_CLOUD = (120, 134, 140)
+RAIN = (66, 165, 245)
+
+FONT_PATHS = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "C:\\Windows\\Fonts\\DejaVuSans.ttf",
+]
+
+# The names Home Assistant shows for its weather conditions
+CONDITION_NAMES = {
+    "clear-night": "Clear, night",
+    "cloudy": "Cloudy",
+    "exceptional": "Exceptional",
+    "fog": "Fog",
+    "hail": "Hail",
+    "lightning": "Lightning",
+    "lightning-rainy": "Lightning, rainy",
+    "partlycloudy": "Partly cloudy",
+    "pouring": "Pouring",
+    "rainy": "Rainy",
+    "snowy": "Snowy",
+    "snowy-rainy": "Snowy, rainy",
+    "sunny": "Sunny",
+    "windy": "Windy",
+    "windy-variant": "Windy, cloudy",
+}
+
+
+def find_font_path() -> Optional[str]:
+    """Return the first DejaVu Sans found on this machine, or None."""
+    return next((path for path in FONT_PATHS if os.path.exists(path)), None)
+
+
+@lru_cache(maxsize=16)
+def load_font(font_path: Optional[str], size: int) -> ImageFont.FreeTypeFont:
+    """Load a font once per path and size, Pillow's bundled font if there is no path."""
+    if font_path:
+        return ImageFont.truetype(font_path, size)
+    return ImageFont.load_default(size)
+
+
+def format_number(value: float) -> str:
+    """Format a measurement with at most one decimal, like the Home Assistant card."""
+    return f"{round(value, 1):g}"
+
+
+def draw_condition_icon(
+    draw: ImageDraw.ImageDraw,
+    condition: str,
+    box: Tuple[int, int, int, int],
+    background: Tuple[int, int, int] = BACKGROUND,
+) -> None:
+    """
+    Draw a weather condition icon from simple shapes.
+
+    Args:
+        draw (ImageDraw.ImageDraw): Where to draw
+        condition (str): A Home Assistant weather condition, e.g. "partlycloudy"
+        box (Tuple[int, int, int, int]): Area of the icon, it is drawn as a square
+        background (Tuple[int, int, int]): Background color, used to cut out the moon
+    """
+    left, top, right, bottom = box
+    size = min(right - left, bottom - top)
+    width = max(1, round(size / 20))
+
+    def at(x: float, y: float) -> Tuple[float, float]:
+        return left + x * size, top + y * size
+
+    def ellipse(x0: float, y0: float, x1: float, y1: float, fill) -> None:
+        draw.ellipse([*at(x0, y0), *at(x1, y1)], fill=fill)
+
+    def sun(cx: float, cy: float, r: float) -> None:
+        for ray in range(8):
+            angle = ray * math.pi / 4
+            dx, dy = math.cos(angle), math.sin(angle)
+            draw.line(
+                [at(cx + dx * r * 1.35, cy + dy * r * 1.35), at(cx + dx * r * 1.75, cy + dy * r * 1.75)],
+                fill=SUN,
+                width=width,
+            )
+        ellipse(cx - r, cy - r, cx + r, cy + r, SUN)
+
+    def cloud(dy: float = 0.0, color=CLOUD) -> None:
+        ellipse(0.08, 0.38 + dy, 0.44, 0.74 + dy, color)
+        ellipse(0.28, 0.2 + dy, 0.72, 0.64 + dy, color)
+        ellipse(0.54, 0.36 + dy, 0.92, 0.74 + dy, color)
+        draw.rectangle([*at(0.26, 0.5 + dy), *at(0.74, 0.74 + dy)], fill=color)
+
+    def drops(xs: List[float]) -> None:
+        for x in xs:
+            draw.line([at(x + 0.04, 0.7), at(x - 0.04, 0.92)], fill=RAIN, width=width)
+
+    def flakes(xs: List[float], r: float = 0.04, color=PRIMARY) -> None:
+        for i, x in enumerate(xs):
+            y = 0.78 + (i % 2) * 0.1
+            ellipse(x - r, y - r, x + r, y + r, color)
+
+    def bolt() -> None:
+        points = [(0.52, 0.5), (0.36, 0.76), (0.48, 0.76), (0.4, 0.98), (0.66, 0.68), (0.54, 0.68), (0.62, 0.5)]
+        draw.polygon([at(x, y) for x, y in points], fill=SUN)
+
+    def lines(ys: List[float], x0: float, x1: float) -> None:
+        for y in ys:
+            draw.line([at(x0, y), at(x1, y)], fill=CLOUD, width=width * 2)
+
+    if condition == "sunny":
+        sun(0.5, 0.5, 0.24)
+    elif condition == "clear-night":
+        ellipse(0.2, 0.2, 0.8, 0.8, MOON)
+        ellipse(0.4, 0.1, 1.0, 0.7, background)
+    elif condition == "partlycloudy":
+        sun(0.64, 0.36, 0.17)
+        cloud(0.12)
+    elif condition == "cloudy":
+        cloud(0.05)
+    elif condition == "rainy":
+        cloud(-0.1)
+        drops([0.3, 0.5, 0.7])
+    elif condition == "pouring":
+        cloud(-0.1, DARK_CLOUD)
+        drops([0.22, 0.36, 0.5, 0.64, 0.78])
+    elif condition == "snowy":
+        cloud(-0.1)
+        flakes([0.3, 0.5, 0.7])
+    elif condition == "snowy-rainy":
+        cloud(-0.1)
+        drops([0.3, 0.7])
+        flakes([0.5])
+    elif condition == "hail":
+        cloud(-0.1, DARK_CLOUD)
+        flakes([0.3, 0.5, 0.7], r=0.06)
+    elif condition in ("lightning", "lightning-rainy"):
+        cloud(-0.1, DARK_CLOUD)
+        bolt()
+        if condition == "lightning-rainy":
+            drops([0.26, 0.78])
+    elif condition == "fog":
+        lines([0.3, 0.45, 0.6, 0.75], 0.12, 0.88)
+    elif condition in ("windy", "windy-variant"):
+        if condition == "windy-variant":
+            cloud(-0.15)
+        lines([0.62, 0.76], 0.1, 0.8)
+        lines([0.9], 0.25, 0.7)
+    else:
+        draw.line([at(0.5, 0.15), at(0.5, 0.65)], fill=SUN, width=width * 3)
+        ellipse(0.43, 0.76, 0.57, 0.9, SUN)
+
+
+class WeatherCardRenderer:
+    def __init__(
+        self,
+        size: Tuple[int, int] = (320, 120),
+        font_path: Optional[str] = None,
+        forecast_days: int = 5,
+    ):
+        """
+        Draw a weather forecast card with Pillow, without a browser.
+
+        The top half shows the current condition, temperature, wind and
+        humidity, the bottom half one column per forecast entry. The layout
+        scales with the size of the card.
+
+        Args:
+            size (Tuple[int, int]): Width and height of the card
+            font_path (str, optional): TrueType font to use, DejaVu Sans or Pillow's own if None
+            forecast_days (int): Maximum number of forecast columns
+        """
+        self.size = size
+        self.font_path = font_path or find_font_path()
+        self.forecast_days = forecast_days
+        self._last: Optional[Tuple[WeatherData, List[Forecast], Image.Image]] = None
+
+    def _font(self, size: float) -> ImageFont.FreeTypeFont:
+        return load_font(self.font_path, max(8, int(size)))
+
+    def render(self, weather: WeatherData, forecast: List[Forecast]) -> Image.Image:
+        """
+        Draw the card, or return the previous image if the data did not change.
+
+        Args:
+            weather (WeatherData): The current weather
+            forecast (List[Forecast]): The forecast, may be empty
+
+        Returns:
+            Image.Image: The card as RGB image
+        """
+        if self._last and self._last[0] == weather and self._last[1] == forecast:
+            return self._last[2]
+
+        width, height = self.size
+        image = Image.new("RGB", self.size, BACKGROUND)
+        draw = ImageDraw.Draw(image)
+        forecast = forecast[: self.forecast_days]
+        current_height = height // 2 if forecast else height
+        self._draw_current(draw, weather, (0, 0, width, current_height))
+        if forecast:
+            self._draw_forecast(draw, forecast, (0, current_height, width, height))
+
+        self._last = (weather, list(forecast), image)
+        return image
+
+    def _draw_current(
+        self, draw: ImageDraw.ImageDraw, weather: WeatherData, box: Tuple[int, int, int, int]
+    ) -> None:
+        left, top, right, bottom = box
+        height = bottom - top
+        padding = max(2, height // 15)
+        icon_size = height - 2 * padding
+        draw_condition_icon(
+            draw, weather.state, (left + padding, top + padding, left + padding + icon_size, bottom - padding)
+        )
+
+        draw.text(
+            (left + icon_size + 3 * padding, top + height / 2),
+            f"{format_number(weather.temperature)}{weather.temperature_unit}",
+            fill=PRIMARY,
+            font=self._font(height * 0.5),
+            anchor="lm",
+        )
+
+        details = f"{format_number(weather.wind_speed)} {weather.wind_speed_unit}, {weather.humidity} %"
+        draw.text(
+            (right - padding, top + height / 2),
+            CONDITION_NAMES.get(weather.state, weather.state),
+            fill=PRIMARY,
+            font=self._font(height * 0.25),
+            anchor="rd",
+        )
+        draw.text(
+            (right - padding, top + height / 2 + padding),
+            details,
+            fill=SECONDARY,
+            font=self._font(height * 0.22),
+            anchor="ra",
+        )
+
+    def _draw_forecast(
+        self, draw: ImageDraw.ImageDraw, forecast: List[Forecast], box: Tuple[int, int, int, int]
+    ) -> None:
+        left, top, right, bottom = box
+        height = bottom - top
+        column_width = (right - left) / len(forecast)
+        label_font = self._font(height * 0.22)
+        icon_size = int(height * 0.4)
+        label_format = _label_format(forecast)
+
+        for i, entry in enumerate(forecast):
+            center = left + column_width * (i + 0.5)
+            try:
+                label = datetime.fromisoformat(entry.datetime).astimezone().strftime(label_format)
+            except ValueError:
+                label = ""
+            draw.text((center, top + 1), label, fill=SECONDARY, font=label_font, anchor="mt")
+
+            icon_top = top + (height - icon_size) // 2
+            icon_left = int(center - icon_size / 2)
+            draw_condition_icon(
+                draw, entry.condition, (icon_left, icon_top, icon_left + icon_size, icon_top + icon_size)
+            )
+
+            temperatures = format_number(entry.temperature) + "°"
+            if entry.templow is not None:
+                temperatures += f" {format_number(entry.templow)}°"
+            draw.text((center, bottom - 1), temperatures, fill=PRIMARY, font=label_font, anchor="md")
+
+
+def _label_format(forecast: List[Forecast]) -> str:
+    """Label daily forecasts with the weekday and hourly ones with the time."""
+    if len(forecast) > 1:
+        try:
+            first = datetime.fromisoformat(forecast[0].datetime)
+            second = datetime.fromisoformat(forecast[1].datetime)
+            if (second - first).total_seconds() < 20 * 3600:
+                return "%H:%M"
+        except ValueError:
+            pass
+    return "%a"
@@ -69,3 +69,41 @@ class WeatherData:
             "friendly_name": self.friendly_name,
             "supported_features": self.supported_features,
         }
+
+
+@dataclass
+class Forecast:
+    datetime: str
+    condition: str
+    temperature: float
+    templow: Optional[float] = None
+    precipitation: Optional[float] = None
+    wind_speed: Optional[float] = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Forecast":
+        """Create a Forecast from one entry of a Home Assistant forecast."""
+
+        def optional_float(key: str) -> Optional[float]:
+            value = data.get(key)
+            return None if value is None else float(value)
+
+        return cls(
+            datetime=data["datetime"],
+            condition=data.get("condition") or "exceptional",
+            temperature=float(data["temperature"]),
+            templow=optional_float("templow"),
+            precipitation=optional_float("precipitation"),
+            wind_speed=optional_float("wind_speed"),
+        )
+
+    @classmethod
+    def from_list(cls, data: List[dict]) -> List["Forecast"]:
+        """Create Forecasts from a Home Assistant forecast, skipping incomplete entries."""
+        forecast = []
+        for entry in data:
+            try:
+                forecast.append(cls.from_dict(entry))
+            except (KeyError, TypeError, ValueError):
+                continue
+        return forecast
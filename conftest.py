@@ -0,0 +1,4 @@
+import os
+
+# Tests log to the console only, without creating log directories in the tree
+os.environ.setdefault("LOG_USE_FILE_HANDLER", "false")
@@ -0,0 +1,223 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+from card_cache import CachedCard, CardCache, CardKey
+from card_formats import encode_variants
+from card_renderer import (
+    CARD_SIZE,
+    DEFAULT_DASHBOARD,
+    MAX_PAGES,
+    WEATHER_CARD_SELECTOR,
+    CardRenderer,
+    create_renderer,
+)
+from metrics import CAPTURE_SECONDS, CAPTURES_IN_FLIGHT, timed_lock
+from renderer_supervisor import RendererSupervisor
+
+# Add project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+from common.logging_config import logger
+
+logger = logger.getChild(__name__)
+
+DEFAULT_CARD = CardKey(DEFAULT_DASHBOARD, WEATHER_CARD_SELECTOR)
+
+
+@dataclass
+class ScheduledCard:
+    last_requested: float
+    next_capture: float = 0.0
+
+
+class CaptureScheduler:
+    def __init__(
+        self,
+        cache: CardCache,
+        persist_path: Optional[Path] = None,
+        interval: float = 30.0,
+        retry_interval: float = 10.0,
+        idle_timeout: float = 600.0,
+        max_cards: int = 8,
+        size: Tuple[int, int] = CARD_SIZE,
+    ) -> None:
+        """
+        Background task that keeps the card cache up to date.
+
+        The default weather card is always refreshed. Other cards are refreshed
+        once they have been requested and dropped again after `idle_timeout`
+        seconds without requests.
+
+        Args:
+            cache (CardCache): Cache that receives every successful capture
+            persist_path (Path, optional): File every new default card is also written to.
+                                           Cards are only kept in memory if omitted.
+            interval (float): Seconds between two successful captures of a card
+            retry_interval (float): Seconds to wait after a failed capture
+            idle_timeout (float): Seconds after which an unrequested card is dropped
+            max_cards (int): Maximum number of cards refreshed at the same time
+            size (Tuple[int, int]): Dimensions of the captured cards
+        """
+        self.cache = cache
+        self.persist_path = persist_path
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self.idle_timeout = idle_timeout
+        self.max_cards = max_cards
+        self.size = size
+        self._cards: Dict[CardKey, ScheduledCard] = {
+            DEFAULT_CARD: ScheduledCard(last_requested=time.monotonic())
+        }
+        # Never capture more cards at once than there are pages to capture them on
+        self._capture_slots = asyncio.Semaphore(MAX_PAGES)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._persist_tasks: Set[asyncio.Task] = set()
+
+    def track(self, key: CardKey) -> bool:
+        """
+        Record a request for a card, scheduling it if it is not refreshed yet.
+
+        Returns:
+            bool: False if the card is new and the maximum number of cards is reached
+        """
+        scheduled = self._cards.get(key)
+        if scheduled is None:
+            if len(self._cards) >= self.max_cards:
+                return False
+            self._cards[key] = ScheduledCard(last_requested=time.monotonic())
+            self._wakeup.set()
+        else:
+            scheduled.last_requested = time.monotonic()
+        return True
+
+    def request_refresh(self, key: CardKey) -> None:
+        """Ask for a capture as soon as possible, e.g. because a stale card was served."""
+        scheduled = self._cards.get(key)
+        if scheduled:
+            scheduled.next_capture = 0.0
+            self._wakeup.set()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="capture-scheduler")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def _expire_idle_cards(self) -> None:
+        now = time.monotonic()
+        for key, scheduled in list(self._cards.items()):
+            if key != DEFAULT_CARD and now - scheduled.last_requested > self.idle_timeout:
+                logger.debug(f"Card {key} is no longer requested, dropping it")
+                del self._cards[key]
+                self.cache.discard(key)
+
+    async def _run(self) -> None:
+        capturer: Optional[CardRenderer] = None
+        try:
+            while True:
+                self._wakeup.clear()
+                if capturer is None:
+                    capturer = await self._start_capturer()
+
+                if capturer is None:
+                    delay = self.retry_interval
+                else:
+                    self._expire_idle_cards()
+                    now = time.monotonic()
+                    due = [k for k, s in self._cards.items() if s.next_capture <= now]
+                    results = await asyncio.gather(
+                        *(self._capture(capturer, key) for key in due)
+                    )
+
+                    now = time.monotonic()
+                    for key, success in zip(due, results):
+                        if key in self._cards:
+                            self._cards[key].next_capture = now + (
+                                self.interval if success else self.retry_interval
+                            )
+                    delay = min(s.next_capture for s in self._cards.values()) - now
+
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), max(0.0, delay))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if capturer:
+                await capturer.close()
+
+    async def _start_capturer(self) -> Optional[CardRenderer]:
+        capturer = RendererSupervisor(lambda: create_renderer(size=self.size))
+        try:
+            return await capturer.start()
+        except Exception as e:
+            logger.error(f"Failed to start the renderer: {e}")
+            await capturer.close()
+            return None
+
+    async def _capture(self, capturer: CardRenderer, key: CardKey) -> bool:
+        async with timed_lock(self._capture_slots, "capture_slots"):
+            start = time.monotonic()
+            try:
+                with CAPTURES_IN_FLIGHT.track_in_progress():
+                    data = await capturer.capture_weather_card(key.dashboard, key.selector)
+                if not data:
+                    logger.error(f"Failed to capture card {key}")
+                    CAPTURE_SECONDS.observe(time.monotonic() - start, result="failure")
+                    return False
+            except Exception as e:
+                logger.error(f"Error capturing card {key}: {e}")
+                CAPTURE_SECONDS.observe(time.monotonic() - start, result="error")
+                return False
+
+        duration = time.monotonic() - start
+        CAPTURE_SECONDS.observe(duration, result="success")
+        previous = self.cache.get(key)
+        card = CachedCard(data=data, captured_at=time.time(), capture_duration=duration)
+        if previous is None or previous.etag != card.etag:
+            # Encode the served formats once per version before the card is stored, so the
+            # requests it wakes up find them instead of all encoding them at the same time.
+            # An unchanged version keeps the encodings of the previous capture.
+            await asyncio.to_thread(encode_variants, card)
+        card = self.cache.set(key, card)
+        logger.debug(f"Captured card {key} in {duration:.2f}s")
+
+        if (
+            self.persist_path
+            and key == DEFAULT_CARD
+            and (previous is None or previous.etag != card.etag)
+        ):
+            # Persisting is a side output, don't let it delay the next capture
+            task = asyncio.create_task(asyncio.to_thread(self._persist, data))
+            self._persist_tasks.add(task)
+            task.add_done_callback(self._persist_tasks.discard)
+        return True
+
+    def _persist(self, data: bytes) -> None:
+        """Atomically replace the persisted card, so readers never see a partial file."""
+        directory = self.persist_path.parent
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, self.persist_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            logger.error(f"Failed to persist weather card to {self.persist_path}: {e}")
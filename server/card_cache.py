@@ -0,0 +1,149 @@
+import asyncio
+import dataclasses
+import hashlib
+import time
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, NamedTuple, Optional
+
+
+class CardKey(NamedTuple):
+    dashboard: str
+    selector: str
+
+
+@dataclass(frozen=True)
+class CachedCard:
+    data: bytes
+    captured_at: float
+    capture_duration: float
+    modified_at: float = 0.0
+    etag: str = field(init=False)
+    # Other encodings of this card version, filled by card_formats
+    variants: Dict[str, Any] = field(default_factory=dict, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # The ETag is derived from the content, so identical captures share a version
+        digest = hashlib.sha256(self.data).hexdigest()[:32]
+        object.__setattr__(self, "etag", digest)
+        if not self.modified_at:
+            object.__setattr__(self, "modified_at", self.captured_at)
+
+    def age(self) -> float:
+        """Seconds elapsed since the card was captured."""
+        return max(0.0, time.time() - self.captured_at)
+
+
+class CardCache:
+    def __init__(self, max_age: float, history_size: int = 8) -> None:
+        """
+        Initialize the CardCache class.
+
+        Args:
+            max_age (float): Seconds a card is considered fresh. Older cards are
+                             still served (stale-while-revalidate) but reported as stale.
+            history_size (int): Number of previous versions kept per card, so
+                                clients holding one of them can get a delta.
+        """
+        self.max_age = max_age
+        self.history_size = history_size
+        self._cards: Dict[CardKey, CachedCard] = {}
+        self._history: Dict[CardKey, Deque[CachedCard]] = {}
+        self._available: Dict[CardKey, asyncio.Event] = {}
+        # Set and replaced whenever a card gets a new version
+        self._changed: Dict[CardKey, asyncio.Event] = {}
+
+    def _event(self, key: CardKey) -> asyncio.Event:
+        return self._available.setdefault(key, asyncio.Event())
+
+    def get(self, key: CardKey) -> Optional[CachedCard]:
+        """Return the latest card without blocking, or None if nothing was captured yet."""
+        return self._cards.get(key)
+
+    def set(self, key: CardKey, card: CachedCard) -> CachedCard:
+        """
+        Store a new card and wake up every request waiting for it or for a new version.
+
+        Returns:
+            CachedCard: The stored card
+        """
+        previous = self._cards.get(key)
+        if previous and previous.etag == card.etag:
+            # Same content as before, keep the original modification time and encodings
+            card = dataclasses.replace(
+                card, modified_at=previous.modified_at, variants=previous.variants
+            )
+        elif previous:
+            history = self._history.setdefault(key, deque(maxlen=self.history_size))
+            history.append(previous)
+        self._cards[key] = card
+        self._event(key).set()
+        if previous is None or previous.etag != card.etag:
+            self._notify_changed(key)
+        return card
+
+    def _notify_changed(self, key: CardKey) -> None:
+        changed = self._changed.pop(key, None)
+        if changed:
+            changed.set()
+
+    def discard(self, key: CardKey) -> None:
+        """Forget a card that is no longer requested."""
+        self._cards.pop(key, None)
+        self._history.pop(key, None)
+        self._available.pop(key, None)
+        # Let subscribers find out that the card is gone
+        self._notify_changed(key)
+
+    def find_version(self, key: CardKey, etag: str) -> Optional[CachedCard]:
+        """Look up a previous version of a card by its ETag."""
+        for card in self._history.get(key, ()):
+            if card.etag == etag:
+                return card
+        return None
+
+    async def wait(self, key: CardKey, timeout: float) -> Optional[CachedCard]:
+        """
+        Wait until a card is available.
+
+        Args:
+            key (CardKey): The card to wait for
+            timeout (float): Maximum number of seconds to wait
+
+        Returns:
+            Optional[CachedCard]: The latest card, or None if the timeout expired
+        """
+        try:
+            await asyncio.wait_for(self._event(key).wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._cards.get(key)
+
+    async def wait_for_change(
+        self, key: CardKey, etag: Optional[str], timeout: float
+    ) -> Optional[CachedCard]:
+        """
+        Wait until the card has another version than the one a client holds.
+
+        Args:
+            key (CardKey): The card to wait for
+            etag (str, optional): ETag of the version the client holds, None if it holds none
+            timeout (float): Maximum number of seconds to wait
+
+        Returns:
+            Optional[CachedCard]: The latest card, the same version if the timeout
+                                  expired, None if there is no card
+        """
+        card = self._cards.get(key)
+        if card is not None and card.etag != etag:
+            return card
+        changed = self._changed.setdefault(key, asyncio.Event())
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._cards.get(key)
+
+    def is_stale(self, card: CachedCard) -> bool:
+        return card.age() > self.max_age
@@ -0,0 +1,183 @@
+import io
+import os
+import sys
+
+from dataclasses import dataclass, field
+from dotenv import load_dotenv
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+from card_cache import CachedCard
+
+# Add project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+from common import card_delta, rgb565
+
+load_dotenv()
+
+PNG = "image/png"
+WEBP = "image/webp"
+RGB565 = rgb565.MEDIA_TYPE
+DELTA = card_delta.MEDIA_TYPE
+
+# Values accepted by the ?format= query parameter and their media types
+FORMATS = {"png": PNG, "webp": WEBP, "webp-lossless": WEBP, "rgb565": RGB565}
+
+# Reduce PNG cards to the colors the stations' RGB565 panels can show, stored with a palette
+PNG_PALETTE = os.getenv("CARD_PNG_PALETTE", "true").lower() == "true"
+# Format sent to clients that accept image/webp: "lossless", "lossy" or "off"
+WEBP_MODE = os.getenv("CARD_WEBP", "lossless").lower()
+WEBP_QUALITY = int(os.getenv("CARD_WEBP_QUALITY", 80))
+
+# The bits an RGB565 panel ignores cleared, per band of an RGB image
+_RGB565_PRECISION = (
+    [v & 0xF8 for v in range(256)] + [v & 0xFC for v in range(256)] + [v & 0xF8 for v in range(256)]
+)
+
+
+@dataclass(frozen=True)
+class CardVariant:
+    media_type: str
+    data: bytes
+    etag: str
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+def negotiated_formats() -> List[str]:
+    """The formats content negotiation can pick, encoded right after every capture."""
+    formats = ["png", "rgb565"]
+    if WEBP_MODE == "lossless":
+        formats.append("webp-lossless")
+    elif WEBP_MODE == "lossy":
+        formats.append("webp")
+    return formats
+
+
+def reduce_to_palette(image: Image.Image) -> Image.Image:
+    """
+    Reduce a card to the colors an RGB565 panel can show, as a palette image.
+
+    Cards in the dark theme are mostly flat grays. Without the bits the panel
+    ignores they fit into 256 colors, so the palette is exact and stations
+    show the same pixels. Larger color sets are reduced with median cut and
+    without dithering, which keeps flat areas flat and compressible.
+
+    Args:
+        image (Image.Image): The card as RGB image
+
+    Returns:
+        Image.Image: The card in "P" mode
+    """
+    reduced = image.point(_RGB565_PRECISION)
+    return reduced.quantize(colors=256, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+
+
+def _encode(card: CachedCard, name: str) -> CardVariant:
+    with Image.open(io.BytesIO(card.data)) as img:
+        width, height = img.size
+        image = img.convert("RGB")
+
+    if name == "rgb565":
+        return CardVariant(
+            RGB565,
+            rgb565.pack(image),
+            f"{card.etag}-rgb565",
+            {"X-Image-Width": str(width), "X-Image-Height": str(height)},
+        )
+
+    output = io.BytesIO()
+    if name == "webp":
+        image.save(output, format="WEBP", quality=WEBP_QUALITY, method=4)
+        return CardVariant(WEBP, output.getvalue(), f"{card.etag}-webp")
+    if name == "webp-lossless":
+        # Lossless for what a panel shows, the ignored bits only cost bytes
+        image.point(_RGB565_PRECISION).save(output, format="WEBP", lossless=True, quality=100, method=4)
+        return CardVariant(WEBP, output.getvalue(), f"{card.etag}-webpll")
+
+    if PNG_PALETTE:
+        reduce_to_palette(image).save(output, format="PNG", optimize=True)
+        if output.tell() < len(card.data):
+            return CardVariant(PNG, output.getvalue(), f"{card.etag}-png8")
+        output = io.BytesIO()
+    image.save(output, format="PNG", optimize=True)
+    # Same pixels as the capture, so it shares the capture's ETag
+    if output.tell() < len(card.data):
+        return CardVariant(PNG, output.getvalue(), card.etag)
+    return CardVariant(PNG, card.data, card.etag)
+
+
+def get_variant(card: CachedCard, name: str) -> CardVariant:
+    """
+    Get the card encoded in the requested format.
+
+    Every format is encoded at most once per card version.
+
+    Args:
+        card (CachedCard): The captured card
+        name (str): One of the keys of FORMATS
+
+    Returns:
+        CardVariant: The encoded card with its own ETag and extra headers
+    """
+    variant = card.variants.get(name)
+    if variant is None:
+        variant = _encode(card, name)
+        card.variants[name] = variant
+    return variant
+
+
+def encode_variants(card: CachedCard) -> None:
+    """Encode every negotiated format of a new card version, so no request waits for an encoder."""
+    for name in negotiated_formats():
+        get_variant(card, name)
+
+
+def base_etag(etag: str) -> str:
+    """Strip the format suffix from a variant ETag, leaving the card version."""
+    return etag.split("-", 1)[0]
+
+
+def decode_variant(variant: CardVariant) -> Image.Image:
+    """Decode an encoded card to the RGB pixels a client gets from it."""
+    if variant.media_type == RGB565:
+        size = (int(variant.headers["X-Image-Width"]), int(variant.headers["X-Image-Height"]))
+        return rgb565.unpack(variant.data, size)
+    with Image.open(io.BytesIO(variant.data)) as img:
+        return img.convert("RGB")
+
+
+def get_delta(
+    card: CachedCard, base: CachedCard, name: str, etag: str, tile_size: int
+) -> Optional[bytes]:
+    """
+    Get the tiles that changed between the variant a client holds and this card.
+
+    Palette PNG and WebP variants don't have the pixels of the capture, so the
+    delta is taken between the decoded pixels of the same format. Patching the
+    client's image then gives exactly the pixels of the new variant.
+
+    Every delta is encoded at most once per pair of variants.
+
+    Args:
+        card (CachedCard): The latest card
+        base (CachedCard): The version the client has
+        name (str): The format the client asked for, one of the keys of FORMATS
+        etag (str): ETag of the variant the client holds
+        tile_size (int): Edge length of a tile in pixels
+
+    Returns:
+        Optional[bytes]: The encoded delta, or None if the client holds another
+                         format or the versions can't be compared
+    """
+    held = get_variant(base, name)
+    if held.etag != etag:
+        return None
+    key = f"{DELTA}:{held.etag}"
+    if key not in card.variants:
+        old, new = decode_variant(held), decode_variant(get_variant(card, name))
+        card.variants[key] = card_delta.encode(old, new, tile_size) if old.size == new.size else None
+    return card.variants[key]
@@ -0,0 +1,81 @@
+import os
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_DASHBOARD = os.getenv("DASHBOARD_PATH", "/dashboard-weather/0")
+WEATHER_CARD_SELECTOR = "hui-weather-forecast-card"
+# Maximum number of cards rendered at the same time
+MAX_PAGES = int(os.getenv("MAX_PAGES", 4))
+# "browser" captures the card from a dashboard, "pillow" draws it from the REST API
+RENDERER = os.getenv("RENDERER", "browser").lower()
+# Width and height of every card, by default the card area of a station's screen
+_card_width, _card_height = os.getenv("CARD_SIZE", "320x120").lower().split("x")
+CARD_SIZE = (int(_card_width), int(_card_height))
+
+
+class CardRenderer(ABC):
+    """
+    A backend that produces weather cards as PNG images.
+
+    Every backend returns cards of exactly `size` and the same PNG bytes for
+    the same content, so the cache, ETags and deltas work alike for all, and
+    clients see no difference when the backend is switched.
+    """
+
+    size: Tuple[int, int]
+
+    @abstractmethod
+    async def start(self) -> "CardRenderer":
+        """Acquire what the backend needs, e.g. launch a browser."""
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Release everything acquired in start."""
+
+    def is_healthy(self) -> bool:
+        """Whether the backend can still produce cards, False e.g. after its browser crashed."""
+        return True
+
+    @abstractmethod
+    async def capture_weather_card(
+        self, dashboard: str = DEFAULT_DASHBOARD, selector: str = WEATHER_CARD_SELECTOR
+    ) -> Optional[bytes]:
+        """
+        Produce the card.
+
+        Args:
+            dashboard (str): Path of the dashboard that shows the card
+            selector (str): CSS selector of the card on the dashboard
+
+        Returns:
+            Optional[bytes]: The card as PNG, None if it could not be produced
+        """
+
+
+def create_renderer(size: Tuple[int, int] = CARD_SIZE, renderer: str = RENDERER) -> CardRenderer:
+    """
+    Create the configured backend.
+
+    The backends are imported here, so a server that draws cards with Pillow
+    does not need Playwright installed.
+
+    Args:
+        size (Tuple[int, int]): Dimensions of the cards
+        renderer (str): "browser" or "pillow"
+
+    Returns:
+        CardRenderer: The backend, not started yet
+    """
+    if renderer == "pillow":
+        from pillow_card_renderer import PillowCardRenderer
+
+        return PillowCardRenderer(size=size)
+    if renderer == "browser":
+        from home_assistant_card_capture import HomeAssistantCardCapture
+
+        return HomeAssistantCardCapture(size=size)
+    raise ValueError(f"Unknown renderer {renderer!r}, use 'browser' or 'pillow'")
@@ -1,13 +1,21 @@
+import asyncio
+import io
+import json
 import os
 import sys
 
 from PIL import Image
-from datetime import datetime
+from card_renderer import CARD_SIZE, DEFAULT_DASHBOARD, MAX_PAGES, WEATHER_CARD_SELECTOR, CardRenderer
 from dotenv import load_dotenv
+from metrics import CAPTURE_PHASE_SECONDS, timed_lock
 from pathlib import Path
 import playwright
-from playwright.sync_api import sync_playwright
-from typing import Optional, Tuple
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from playwright.async_api import Page, Route, async_playwright
+from typing import AsyncIterator, FrozenSet, Optional, Tuple
+from urllib.parse import urlsplit
 
 # Add project root to Python path
 project_root = str(Path(__file__).parent.parent)
@@ -24,196 +32,566 @@ logger = logger.getChild(__name__)
 load_dotenv()
 
 HA_URL = os.getenv("HA_URL")
-dashboard_url = f"{HA_URL}/dashboard-weather/0"
 HA_USERNAME = os.getenv("HA_USERNAME")
 HA_PASSWORD = os.getenv("HA_PASSWORD")
+# A long-lived access token, injected so the login form is never shown
+HA_TOKEN = os.getenv("HA_TOKEN")
+# Cookies and local storage of the browser, kept across restarts
+STORAGE_STATE_PATH = os.getenv("STORAGE_STATE_PATH", "browser_state.json")
 ENABLE_VIDEO_CAPTURE = os.getenv("ENABLE_VIDEO_CAPTURE", "false").lower() == "true"
+LIVE_PAGE = os.getenv("LIVE_PAGE", "true").lower() == "true"
+
+# Chromium features a headless capture never needs
+LEAN_CHROMIUM_ARGS = (
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-dev-shm-usage",
+    "--mute-audio",
+    "--no-first-run",
+)
+
+
+@dataclass(frozen=True)
+class CaptureProfile:
+    """
+    How the browser is launched and how dashboards are loaded.
+
+    Attributes:
+        name: Name used in CAPTURE_PROFILE and benchmark results
+        engine: Playwright browser type, "chromium", "firefox" or "webkit"
+        viewport: Width and height of the viewport in CSS pixels
+        device_scale_factor: Device pixels per CSS pixel
+        native_size: Lay the card out at the target size, so the screenshot needs no resize
+        blocked_resource_types: Playwright resource types that are never loaded
+        block_third_party: Only load requests to Home Assistant itself
+        launch_args: Extra command line arguments for Chromium
+    """
+
+    name: str
+    engine: str = "chromium"
+    viewport: Tuple[int, int] = (1920, 1080)
+    device_scale_factor: float = 1.0
+    native_size: bool = False
+    blocked_resource_types: FrozenSet[str] = frozenset()
+    block_third_party: bool = False
+    launch_args: Tuple[str, ...] = ()
+
+    @property
+    def intercepts_requests(self) -> bool:
+        return bool(self.blocked_resource_types) or self.block_third_party
+
+
+CAPTURE_PROFILES = {
+    # Renders the full desktop dashboard and scales the card down
+    "desktop": CaptureProfile("desktop"),
+    # A phone sized single column, the card laid out at the target size and
+    # nothing loaded that the card does not show
+    "native": CaptureProfile(
+        "native",
+        viewport=(360, 800),
+        native_size=True,
+        blocked_resource_types=frozenset({"image", "media"}),
+        block_third_party=True,
+        launch_args=LEAN_CHROMIUM_ARGS,
+    ),
+}
+CAPTURE_PROFILE = os.getenv("CAPTURE_PROFILE", "native")
+
+# Home Assistant pushes state changes to the frontend over its websocket, so a
+# loaded dashboard stays current as long as that connection is alive.
+PAGE_HEALTH_SCRIPT = """() => {
+    const ha = document.querySelector('home-assistant');
+    return Boolean(ha && ha.hass && ha.hass.connected);
+}"""
+
+# Lays a card out with the aspect ratio of the target and scales it to the
+# target size in CSS pixels. A card wider than its column wraps less and gets
+# lower, so the narrowest layout width that fits the target height is found by
+# bisection. A card lower than the target at the target width gets taller.
+FIT_CARD_SCRIPT = """(card, [width, height]) => {
+    const style = card.style;
+    // How much wider the card would have to be to fit the height, after laying it out
+    const layout = (layoutWidth) => {
+        style.width = style.maxWidth = layoutWidth + 'px';
+        return card.offsetHeight * width / height - layoutWidth;
+    };
+    style.transform = style.height = '';
+    style.boxSizing = 'border-box';
+    style.transformOrigin = 'top left';
+    let high = width;
+    const excess = layout(width);
+    if (excess > 0) {
+        let low = width;
+        high = width + excess;
+        for (let i = 0; i < 10; i++) {
+            const middle = (low + high) / 2;
+            if (layout(middle) > 0) {
+                low = middle;
+            } else {
+                high = middle;
+            }
+        }
+        layout(high);
+    }
+    const scale = width / high;
+    style.height = height / scale + 'px';
+    style.transform = `scale(${scale})`;
+}"""
+
+# Runs before any script of a page. The frontend reads the theme and its
+# tokens from local storage when it starts, so the first paint is already
+# dark and authenticated.
+INIT_SCRIPT = """(settings) => {
+    if (location.origin !== settings.origin) {
+        return;
+    }
+    localStorage.setItem('selectedTheme', JSON.stringify({dark: true}));
+    // Tokens of a login with the form have a refresh token, keep those
+    const stored = JSON.parse(localStorage.getItem('hassTokens') || 'null');
+    if (settings.token && !(stored && stored.refresh_token)) {
+        localStorage.setItem('hassTokens', JSON.stringify({
+            hassUrl: settings.origin,
+            clientId: settings.origin + '/',
+            access_token: settings.token,
+            token_type: 'Bearer',
+            expires_in: 1800,
+            // A long-lived token never has to be refreshed
+            expires: 4102444800000,
+            refresh_token: '',
+        }));
+    }
+}"""
+
+
+def _origin(url: Optional[str]) -> Optional[str]:
+    """Return scheme, host and port of a URL, the origin local storage belongs to."""
+    if not url:
+        return None
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class DashboardPage:
+    def __init__(self, page: Page, dashboard_url: str, on_login=None) -> None:
+        """
+        A browser page that shows one dashboard and is kept warm between captures.
+
+        Args:
+            page (Page): The Playwright page
+            dashboard_url (str): The URL of the Home Assistant dashboard
+            on_login (callable, optional): Coroutine function awaited after logging in with the form
+        """
+        self.page = page
+        self.dashboard_url = dashboard_url
+        self.on_login = on_login
+        self.loaded = False
+        self.crashed = False
+        # A page can only navigate or take one screenshot at a time
+        self.lock = asyncio.Lock()
+        # Captures that got the page, it is not evicted while any is using it
+        self.users = 0
+        self.page.on("crash", self._on_crash)
+
+    def _on_crash(self, page: Page) -> None:
+        logger.warning(f"Page for {self.dashboard_url} crashed, it will be reopened")
+        self.crashed = True
+        self.loaded = False
+
+    def is_usable(self) -> bool:
+        return not self.crashed and not self.page.is_closed()
+
+    async def close(self) -> None:
+        if not self.page.is_closed():
+            await self.page.close()
+
+    async def is_live(self, selector: str) -> bool:
+        """
+        Check whether the already loaded dashboard can be captured without reloading it.
+
+        Args:
+            selector (str): Selector of the card that should be captured
+
+        Returns:
+            bool: True if the page is loaded, still connected to Home Assistant
+                  and shows the card
+        """
+        if not LIVE_PAGE or not self.loaded or not self.is_usable():
+            return False
+        try:
+            if not await self.page.evaluate(PAGE_HEALTH_SCRIPT):
+                logger.info("Dashboard page lost its Home Assistant connection")
+                return False
+            return await self.page.locator(selector).is_visible()
+        except playwright._impl._errors.Error as e:
+            logger.warning(f"Dashboard page is broken: {e}")
+            return False
+
+    async def load(self, selector: str) -> bool:
+        """
+        Navigate to the dashboard, log in if needed and wait for the card.
+
+        Args:
+            selector (str): Selector of the card that should be captured
+
+        Returns:
+            bool: True if the card is visible
+        """
+        self.loaded = False
+        with CAPTURE_PHASE_SECONDS.time(phase="navigation"):
+            await self.page.goto(self.dashboard_url, wait_until="domcontentloaded")
+
+        # First check if we need to log in
+        try:
+            # Wait for either the card or the login form
+            with CAPTURE_PHASE_SECONDS.time(phase="wait_card"):
+                await self.page.wait_for_selector(
+                    f"{selector}, input[name='username']",
+                    state="visible",
+                    timeout=5000
+                )
+
+            # Check if we're on the login page
+            with CAPTURE_PHASE_SECONDS.time(phase="login_detection"):
+                login_required = await self.page.locator('input[name="username"]').is_visible()
+            if login_required:
+                logger.debug("Login form detected, attempting to log in...")
+                with CAPTURE_PHASE_SECONDS.time(phase="login"):
+                    await self.page.locator('input[name="username"]').fill(HA_USERNAME)
+                    await self.page.locator('input[name="password"]').fill(HA_PASSWORD)
+                    await self.page.locator('input[name="password"]').press("Enter")
+
+                    # Wait for the card after login
+                    await self.page.locator(selector).wait_for(
+                        state="visible", timeout=10000
+                    )
+                if self.on_login:
+                    await self.on_login()
+            else:
+                logger.debug("Already authenticated, proceeding with capture...")
+        except playwright._impl._errors.TimeoutError as e:
+            logger.error(f"Timeout waiting for {selector} or login form: {e}")
+            return False
+
+        self.loaded = True
+        return True
 
 
-class HomeAssistantCardCapture:
+class HomeAssistantCardCapture(CardRenderer):
     def __init__(
-        self, output_path: Optional[str] = None, size: Tuple[int, int] = (320, 240)
+        self,
+        output_path: Optional[str] = None,
+        size: Tuple[int, int] = CARD_SIZE,
+        max_pages: int = MAX_PAGES,
+        profile: Optional[CaptureProfile] = None,
     ) -> None:
         """
         Initialize the HomeAssistantCardCapture class.
 
+        All dashboards share one browser and one context (and with it the login),
+        each dashboard gets its own page. At most `max_pages` pages are kept
+        open, the least recently used idle page is closed to make room.
+
+        Blocking requests needs Playwright's request interception, which
+        turns off the browser's HTTP cache. With live pages the dashboard is
+        rarely loaded, so the saved bytes outweigh the cache.
+
         Args:
             output_path (str, optional): Directory where images will be saved.
                                        Defaults to current working directory.
-            size (Tuple[int, int], optional): Dimensions for the screenshot (width, height).
-                                            Defaults to (320, 240).
+            size (Tuple[int, int], optional): Dimensions of the cards (width, height).
+                                            Defaults to CARD_SIZE.
+            max_pages (int, optional): Maximum number of open dashboard pages.
+            profile (CaptureProfile, optional): How to launch the browser and load pages.
+                                                Defaults to the CAPTURE_PROFILE profile.
         """
         self.output_path = output_path or os.getcwd()
-        self.playwright = sync_playwright().start()
-        self.browser = self.playwright.chromium.launch(headless=True)
         self.size = size
+        self.max_pages = max_pages
+        self.profile = profile or CAPTURE_PROFILES[CAPTURE_PROFILE]
+        self.origin = _origin(HA_URL)
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self.pages: "OrderedDict[str, DashboardPage]" = OrderedDict()
+        self._pages_lock = asyncio.Lock()
+        self.storage_state_path = STORAGE_STATE_PATH or None
+        self.disconnected = False
+
+    async def start(self) -> "HomeAssistantCardCapture":
+        """Launch the browser and create the context shared by all pages."""
+        self.playwright = await async_playwright().start()
+        launch_options = {"headless": True}
+        if self.profile.engine == "chromium" and self.profile.launch_args:
+            launch_options["args"] = list(self.profile.launch_args)
+        browser_type = getattr(self.playwright, self.profile.engine)
+        self.browser = await browser_type.launch(**launch_options)
+        self.browser.on("disconnected", self._on_disconnected)
 
         # Create context options
+        viewport = {"width": self.profile.viewport[0], "height": self.profile.viewport[1]}
         context_options = {
-            "viewport": {"width": 1920, "height": 1080},
+            "viewport": viewport,
+            "device_scale_factor": self.profile.device_scale_factor,
         }
 
         # Add video recording options if enabled
         if ENABLE_VIDEO_CAPTURE:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            video_path = os.path.join(self.output_path, f"recording_{timestamp}.webm")
             context_options.update(
                 {
                     "record_video_dir": self.output_path,
-                    "record_video_size": {"width": 1920, "height": 1080},
+                    "record_video_size": viewport,
                 }
             )
 
+        # Start with the cookies and local storage of the last run, so a
+        # session that is still valid skips the login
+        if self.storage_state_path and os.path.exists(self.storage_state_path):
+            context_options["storage_state"] = self.storage_state_path
+            logger.debug(f"Restoring browser state from {self.storage_state_path}")
+
         # Initialize context with or without video recording
-        self.context = self.browser.new_context(**context_options)
-        self.page = self.context.new_page()
-
-    def __del__(self):
-        """Clean up the Playwright resources when the object is destroyed."""
-        if hasattr(self, "context"):
-            self.context.close()
-        if hasattr(self, "browser"):
-            self.browser.close()
-        if hasattr(self, "playwright"):
-            self.playwright.stop()
-
-    def capture_weather_card(
-        self, output_file: str, dashboard_url: str = dashboard_url
-    ) -> Optional[str]:
+        self.context = await self.browser.new_context(**context_options)
+        await self.context.add_init_script(
+            script=f"({INIT_SCRIPT})({json.dumps({'origin': self.origin, 'token': HA_TOKEN})})"
+        )
+        if self.profile.intercepts_requests:
+            await self.context.route("**/*", self._filter_request)
+        return self
+
+    def _on_disconnected(self, browser) -> None:
+        logger.warning("The browser closed or crashed")
+        self.disconnected = True
+
+    def is_healthy(self) -> bool:
+        return not self.disconnected
+
+    async def _filter_request(self, route: Route) -> None:
+        """Abort the requests the capture profile blocks, let all others through."""
+        request = route.request
+        if request.resource_type in self.profile.blocked_resource_types or (
+            self.profile.block_third_party
+            and not request.url.startswith("data:")
+            and _origin(request.url) != self.origin
+        ):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def save_storage_state(self) -> None:
+        """Write the cookies and local storage to disk, readable only by the owner."""
+        if not self.storage_state_path:
+            return
+        state = await self.context.storage_state()
+        tmp_path = f"{self.storage_state_path}.tmp"
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.storage_state_path)
+            logger.debug(f"Saved browser state to {self.storage_state_path}")
+        except OSError as e:
+            logger.error(f"Failed to save browser state to {self.storage_state_path}: {e}")
+
+    async def close(self) -> None:
+        """Clean up the Playwright resources, also after the browser crashed."""
+        for resource, closer in (
+            (self.context, "close"),
+            (self.browser, "close"),
+            (self.playwright, "stop"),
+        ):
+            if resource:
+                try:
+                    await getattr(resource, closer)()
+                except playwright._impl._errors.Error as e:
+                    logger.debug(f"Ignoring error while closing the browser: {e}")
+
+    async def _get_page(self, dashboard_url: str) -> DashboardPage:
         """
-        Capture a weather card from a Home Assistant dashboard.
+        Get the page showing the dashboard, opening one if needed.
 
         Args:
             dashboard_url (str): The URL of the Home Assistant dashboard
-            output_file (str): The filename where the image will be saved
 
         Returns:
-            Optional[str]: Path to the saved image file, or None if capture failed
+            DashboardPage: The page, marked as most recently used and pinned
+                           until the caller decrements its `users`
         """
-        self.page.goto(dashboard_url, wait_until="domcontentloaded")
-
-        # First check if we need to log in
-        try:
-            # Wait for either the weather card or the login form
-            self.page.wait_for_selector(
-                "hui-weather-forecast-card, input[name='username']",
-                state="visible",
-                timeout=5000
-            )
-            
-            # Check if we're on the login page
-            if self.page.locator('input[name="username"]').is_visible():
-                logger.debug("Login form detected, attempting to log in...")
-                self.page.locator('input[name="username"]').fill(HA_USERNAME)
-                self.page.locator('input[name="password"]').fill(HA_PASSWORD)
-                self.page.locator('input[name="password"]').press("Enter")
-                
-                # Wait for the weather card after login
-                self.page.locator("hui-weather-forecast-card").wait_for(
-                    state="visible", timeout=10000
+        async with timed_lock(self._pages_lock, "pages"):
+            dashboard_page = self.pages.get(dashboard_url)
+            if dashboard_page and not dashboard_page.is_usable():
+                del self.pages[dashboard_url]
+                await dashboard_page.close()
+                dashboard_page = None
+
+            if dashboard_page is None:
+                await self._evict_idle_pages(self.max_pages - 1)
+                dashboard_page = DashboardPage(
+                    await self.context.new_page(),
+                    dashboard_url,
+                    on_login=self.save_storage_state,
                 )
-            else:
-                logger.debug("Already authenticated, proceeding with capture...")
-        except playwright._impl._errors.TimeoutError as e:
-            logger.error(f"Timeout waiting for weather card or login form: {e}")
-            return None
-
-        # Set dark theme in local storage
-        self.page.evaluate(
-            """() => {
-            localStorage.setItem('selectedTheme', JSON.stringify({dark: true}));
-        }"""
-        )
+                self.pages[dashboard_url] = dashboard_page
 
-        # Wait for the weather card to be present
-        self.page.locator("hui-weather-forecast-card").wait_for(state="visible")
+            self.pages.move_to_end(dashboard_url)
+            # Pin the page before the pages lock is released, so no other capture evicts it
+            dashboard_page.users += 1
+            return dashboard_page
 
-        # Ensure the output directory exists
-        output_dir = os.path.dirname(output_file)
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+    @asynccontextmanager
+    async def _use_page(self, dashboard_url: str) -> AsyncIterator[DashboardPage]:
+        """Get the page showing the dashboard, pinned while the block runs."""
+        dashboard_page = await self._get_page(dashboard_url)
+        try:
+            yield dashboard_page
+        finally:
+            dashboard_page.users -= 1
+
+    async def _evict_idle_pages(self, keep: int) -> None:
+        """Close least recently used pages that are not in use until at most `keep` remain."""
+        for url, dashboard_page in list(self.pages.items()):
+            if len(self.pages) <= keep:
+                return
+            if dashboard_page.users:
+                continue
+            logger.debug(f"Closing idle page for {url}")
+            del self.pages[url]
+            await dashboard_page.close()
+
+    async def capture_weather_card(
+        self, dashboard: str = DEFAULT_DASHBOARD, selector: str = WEATHER_CARD_SELECTOR
+    ) -> Optional[bytes]:
+        """
+        Capture a card from a Home Assistant dashboard.
 
-        # Get the full path for the output file
-        full_path = os.path.join(self.output_path, output_file)
+        In live page mode the dashboard is loaded once and kept open, so a
+        capture is a single element screenshot. The page is only reloaded when
+        it crashed or lost its connection.
 
-        # Take screenshot of just the weather card element
-        self.page.locator("hui-weather-forecast-card").screenshot(path=full_path)
+        The screenshot never touches the disk. With a native size profile the
+        card is laid out at the card size, so the screenshot is used as is.
+        Otherwise it is resized in memory and placed on a canvas of exactly the
+        card size, like the cards of every backend, because its height follows
+        the dashboard's layout.
 
-        # Get the video path from the context if video recording is enabled
-        if ENABLE_VIDEO_CAPTURE:
-            self.page.locator("hui-weather-forecast-card").screenshot(
-                path=os.path.join(self.output_path, "screenshot.png")
-            )
-            video_path = self.page.video.path()
-            logger.debug(f"Recording saved to: {video_path}")
+        Args:
+            dashboard (str): Path of the Home Assistant dashboard, e.g. /dashboard-weather/0
+            selector (str): Selector of the card element to capture
 
-        full_path = self.scale_image(full_path, self.size[0], self.size[1])
-        return full_path
+        Returns:
+            Optional[bytes]: The PNG encoded card, or None if capture failed
+        """
+        async with self._use_page(f"{HA_URL}{dashboard}") as dashboard_page:
+            async with timed_lock(dashboard_page.lock, "page"):
+                with CAPTURE_PHASE_SECONDS.time(phase="live_check"):
+                    live = await dashboard_page.is_live(selector)
+                if live:
+                    logger.debug(f"Reusing live page for {dashboard}")
+                elif not await dashboard_page.load(selector):
+                    return None
+
+                # Take screenshot of just the card element
+                try:
+                    card = dashboard_page.page.locator(selector)
+                    if self.profile.native_size:
+                        # Lay the card out so its screenshot has exactly the card size
+                        await card.evaluate(
+                            FIT_CARD_SCRIPT,
+                            [side / self.profile.device_scale_factor for side in self.size],
+                        )
+                    with CAPTURE_PHASE_SECONDS.time(phase="screenshot"):
+                        screenshot = await card.screenshot()
+                except playwright._impl._errors.Error as e:
+                    logger.error(f"Failed to take screenshot of {selector}: {e}")
+                    dashboard_page.loaded = False
+                    return None
+
+                # Get the video path from the context if video recording is enabled
+                if ENABLE_VIDEO_CAPTURE:
+                    with open(os.path.join(self.output_path, "screenshot.png"), "wb") as f:
+                        f.write(screenshot)
+                    video_path = await dashboard_page.page.video.path()
+                    logger.debug(f"Recording saved to: {video_path}")
+
+        # Resizing is CPU bound, keep it off the event loop
+        with CAPTURE_PHASE_SECONDS.time(phase="scale"):
+            return await asyncio.to_thread(
+                self.scale_image, screenshot, self.size[0], self.size[1]
+            )
 
-    def scale_image(self, image_path: str, max_width: int, max_height: int) -> str:
+    def scale_image(self, image_data: bytes, width: int, height: int) -> bytes:
         """
-        Scale down an image to fit within maximum dimensions while maintaining aspect ratio.
+        Fit a screenshot onto a canvas of exactly the card size.
+
+        The image is scaled down if it is larger, keeping its aspect ratio, and
+        placed at the top center. The rest of the canvas gets the color of the
+        top left pixel, the dashboard background around the card's corners.
+        An image that is at most a pixel off, from rounding the position of a
+        card laid out at the card size, is cropped or padded without scaling.
 
         Args:
-            image_path (str): Path to the input image
-            max_width (int): Maximum width for the scaled image
-            max_height (int): Maximum height for the scaled image
+            image_data (bytes): The PNG encoded input image
+            width (int): Width of the card
+            height (int): Height of the card
 
         Returns:
-            str: Path to the scaled image file
+            bytes: The PNG encoded card
         """
-        # Open the image
-        with Image.open(image_path) as img:
-            # Calculate the scaling factor to maintain aspect ratio
-            width_ratio = max_width / img.width
-            height_ratio = max_height / img.height
-            scale_factor = min(width_ratio, height_ratio)
-
-            # Only scale down if the image is larger than max dimensions
-            if scale_factor < 1:
-                # Calculate new dimensions
-                new_width = int(img.width * scale_factor)
-                new_height = int(img.height * scale_factor)
-
-                # Resize the image
-                resized_img = img.resize(
-                    (new_width, new_height), Image.Resampling.LANCZOS
+        with Image.open(io.BytesIO(image_data)) as img:
+            if img.size == (width, height):
+                logger.debug("Image already has the card size, no scaling needed")
+                return image_data
+
+            img = img.convert("RGB")
+            scale_factor = min(width / img.width, height / img.height)
+            rounded = abs(img.width - width) <= 1 and abs(img.height - height) <= 1
+            # Only scale down, smaller cards are padded
+            if scale_factor < 1 and not rounded:
+                img = img.resize(
+                    (max(1, int(img.width * scale_factor)), max(1, int(img.height * scale_factor))),
+                    Image.Resampling.LANCZOS,
                 )
+            canvas = Image.new("RGB", (width, height), img.getpixel((0, 0)))
+            canvas.paste(img, (max(0, (width - img.width) // 2), 0))
 
-                # Save the resized image
-                resized_img.save(image_path, quality=100)
-                return image_path
-            else:
-                logger.debug(
-                    "Image is already smaller than max dimensions, no scaling needed"
-                )
-                return image_path
+            # Encode the card quickly, the served formats are compressed from it
+            output = io.BytesIO()
+            canvas.save(output, format="PNG", compress_level=1)
+            return output.getvalue()
 
 
-def main() -> None:
-    if not all([HA_URL, HA_USERNAME, HA_PASSWORD]):
+async def main() -> None:
+    if not HA_URL or not (HA_TOKEN or (HA_USERNAME and HA_PASSWORD)):
         logger.error(
-            "Error: HA_URL, HA_USERNAME, and HA_PASSWORD must be set in .env file"
+            "Error: HA_URL and either HA_TOKEN or HA_USERNAME and HA_PASSWORD must be set in .env file"
         )
         return
 
     # Create an instance of HomeAssistantCardCapture
-    capturer = HomeAssistantCardCapture()
+    capturer = await HomeAssistantCardCapture().start()
 
     # Example usage
     output_file = "weather_card.png"
 
     logger.info(f"Using Home Assistant URL: {HA_URL}")
-    logger.info(f"Dashboard URL: {dashboard_url}")
+    logger.info(f"Dashboard: {DEFAULT_DASHBOARD}")
 
     # Capture the weather card
-    result = capturer.capture_weather_card(output_file)
+    try:
+        result = await capturer.capture_weather_card()
+    finally:
+        await capturer.close()
 
     if result:
-        logger.info(f"Successfully captured weather card to: {result}")
+        with open(output_file, "wb") as f:
+            f.write(result)
+        logger.info(f"Successfully captured weather card to: {output_file}")
     else:
         logger.error("Failed to capture weather card")
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,16 +1,29 @@
-import logging
+import asyncio
+import math
 import os
-import signal
+import re
 import sys
-import threading
+import time
 
+from aiohttp import web
+from aiohttp.helpers import ETAG_ANY
+from aiohttp.abc import AbstractAccessLogger
 from dotenv import load_dotenv
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from email.utils import formatdate
 from pathlib import Path
-from typing import Optional
-from urllib.parse import urlparse
+from typing import Dict, Optional, Tuple
 
-from home_assistant_card_capture import HomeAssistantCardCapture
+from capture_scheduler import DEFAULT_CARD, CaptureScheduler
+from card_cache import CachedCard, CardCache, CardKey
+from card_formats import DELTA, FORMATS, WEBP_MODE, base_etag, get_delta, get_variant
+from metrics import (
+    CACHE_REQUESTS,
+    CARD_SUBSCRIBERS,
+    HTTP_REQUEST_SECONDS,
+    HTTP_REQUESTS_IN_FLIGHT,
+    REGISTRY,
+)
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 # Add project root to Python path
 project_root = str(Path(__file__).parent.parent)
@@ -22,95 +35,286 @@ logger = logger.getChild(__name__)
 
 load_dotenv()
 
-lock = threading.Lock()
-capturer = HomeAssistantCardCapture(size=(320, 240))
-image_path = Path("weather_card.png")
 port = int(os.getenv("PORT", 8080))
 api_key = os.getenv("API_KEY")
+capture_interval = float(os.getenv("CAPTURE_INTERVAL", 30))
+capture_retry_interval = float(os.getenv("CAPTURE_RETRY_INTERVAL", 10))
+card_wait_timeout = float(os.getenv("CARD_WAIT_TIMEOUT", 30))
+keepalive_timeout = float(os.getenv("KEEPALIVE_TIMEOUT", 75))
+card_output_path = os.getenv("CARD_OUTPUT_PATH")
+card_idle_timeout = float(os.getenv("CARD_IDLE_TIMEOUT", 600))
+max_cards = int(os.getenv("MAX_CARDS", 8))
+card_history_size = int(os.getenv("CARD_HISTORY_SIZE", 8))
+delta_tile_size = int(os.getenv("DELTA_TILE_SIZE", 32))
+# Longest a request for card updates is held open, below the idle timeout of common proxies
+long_poll_timeout = float(os.getenv("LONG_POLL_TIMEOUT", 55))
+
+# Dashboards are paths on HA_URL, never a scheme, host or query
+DASHBOARD_PATTERN = re.compile(r"^(/[\w\-]+)+$")
+MAX_SELECTOR_LENGTH = 200
+
+card_cache = CardCache(max_age=capture_interval, history_size=card_history_size)
+scheduler = CaptureScheduler(
+    card_cache,
+    Path(card_output_path) if card_output_path else None,
+    interval=capture_interval,
+    retry_interval=capture_retry_interval,
+    idle_timeout=card_idle_timeout,
+    max_cards=max_cards,
+)
 
 if not api_key:
     logger.warning("No API_KEY set in environment variables. Server will run without authentication.")
 
-def signal_handler(signum: int, frame: Optional[object]) -> None:
-    """Handle shutdown signals gracefully"""
-    logger.info(f"Received signal {signum}. Shutting down gracefully...")
-    sys.exit(0)
-
 
-class WeatherServer(BaseHTTPRequestHandler):
-    def log_message(self, format, *args):
-        # Don't log health check requests
-        if self.path == '/health':
-            return
-        super().log_message(format, *args)
-
-    def do_GET(self):
-        # Extract just the path component if full URL is provided
-        path = urlparse(self.path).path
-        
-        # Skip API key check for health endpoint
-        if path != "/health":
-            # Check API key if it's set
-            if api_key:
-                auth_header = self.headers.get("X-API-Key")
-                if not auth_header or auth_header != api_key:
-                    self.send_error(401, "Unauthorized")
-                    return
-        
-        if path == "/":
-            self.index()
-        elif path == "/weather-card":
-            self.get_weather_card()
-        elif path == "/health":
-            self.health_check()
-        else:
-            self.send_error(404, "Not found")
-
-    def health_check(self):
-        # Only allow requests from localhost
-        client_address = self.client_address[0]
-        if client_address not in ('127.0.0.1', 'localhost', '::1'):
-            self.send_error(403, "Forbidden - Health check only available from localhost")
+class AccessLogger(AbstractAccessLogger):
+    def log(self, request: web.BaseRequest, response: web.StreamResponse, time: float) -> None:
+        # Don't log health checks and metric scrapes
+        if request.path in ("/health", "/metrics"):
             return
+        self.logger.info(
+            f'{request.remote} "{request.method} {request.path_qs}" '
+            f"{response.status} {response.body_length} {time:.3f}s"
+        )
+
+
+def get_request_api_key(request: web.Request) -> Optional[str]:
+    """Read the key from X-API-Key, or from a bearer token as sent by Prometheus."""
+    key = request.headers.get("X-API-Key")
+    if key:
+        return key
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    return token.strip() if scheme.lower() == "bearer" else None
+
+
+@web.middleware
+async def metrics_middleware(request: web.Request, handler):
+    # Label by route, not by the raw path, so unknown paths don't create new series
+    resource = request.match_info.route.resource
+    path = resource.canonical if resource else "other"
+    status = 500
+    start = time.perf_counter()
+    try:
+        with HTTP_REQUESTS_IN_FLIGHT.track_in_progress():
+            response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, path=path, status=str(status))
+
+
+@web.middleware
+async def api_key_middleware(request: web.Request, handler):
+    # Skip API key check for health endpoint
+    if request.path != "/health" and api_key:
+        if get_request_api_key(request) != api_key:
+            raise web.HTTPUnauthorized(text="Unauthorized")
+    return await handler(request)
 
-        self.send_response(200)
-        self.send_header("Content-type", "application/json")
-        self.end_headers()
-        self.wfile.write(b'{"status": "healthy"}')
-
-    def index(self):
-        self.send_response(200)
-        self.send_header("Content-type", "text/plain")
-        self.end_headers()
-        self.wfile.write(b"Hello World")
-
-    def get_weather_card(self):
-        image_exists = image_path.exists()
-        if lock.acquire(blocking=not image_exists):
-            try:
-                capturer.capture_weather_card(image_path)
+
+async def health_check(request: web.Request) -> web.Response:
+    # Only allow requests from localhost
+    if request.remote not in ("127.0.0.1", "localhost", "::1"):
+        raise web.HTTPForbidden(
+            text="Forbidden - Health check only available from localhost"
+        )
+    return web.json_response({"status": "healthy"})
+
+
+async def index(request: web.Request) -> web.Response:
+    return web.Response(text="Hello World")
+
+
+def is_not_modified(request: web.Request, etag: str, modified_at: float) -> bool:
+    """Evaluate the conditional request headers against the cached card."""
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110)
+    if request.if_none_match:
+        return any(tag.value in (etag, ETAG_ANY) for tag in request.if_none_match)
+    if request.if_modified_since:
+        return int(modified_at) <= request.if_modified_since.timestamp()
+    return False
+
+
+def accepted_media_types(request: web.Request) -> Dict[str, float]:
+    """Parse the Accept header into media types and their q-values, leaving out refused ones."""
+    accepted = {}
+    for media_range in request.headers.get("Accept", "").split(","):
+        media_type, *params = (part.strip() for part in media_range.split(";"))
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
                 try:
-                    capturer.capture_weather_card(image_path)
-                    self.send_response(200)
-                    self.send_header("Content-type", "image/png")
-                    self.end_headers()
-                except Exception as e:
-                    logger.error(f"Error serving weather card: {e}")
-                    self.send_error(500, "Internal server error")
-            finally:
-                lock.release()
-        with open(image_path, "rb") as f:
-            self.wfile.write(f.read())
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        # q=0 means not acceptable, a nan q-value fails the comparison as well
+        if media_type and quality > 0:
+            accepted[media_type.lower()] = quality
+    return accepted
 
 
-if __name__ == "__main__":
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
+def get_format(request: web.Request) -> str:
+    """Pick the card format from the ?format= parameter or the Accept header."""
+    name = request.query.get("format")
+    if name is not None:
+        if name not in FORMATS:
+            raise web.HTTPBadRequest(text=f"Unknown format, use one of {', '.join(FORMATS)}")
+        return name
+    accepted = accepted_media_types(request)
+    candidates = ["rgb565"]
+    if WEBP_MODE in ("lossless", "lossy"):
+        candidates.append("webp-lossless" if WEBP_MODE == "lossless" else "webp")
+    candidates.append("png")
+    # The highest q-value wins, ties go to the format listed first
+    best = max(candidates, key=lambda name: accepted.get(FORMATS[name], 0.0))
+    return best if accepted.get(FORMATS[best], 0.0) > 0 else "png"
 
-    server = HTTPServer(("0.0.0.0", port), WeatherServer)
-    logger.info(f"Starting server on port {port}")
+
+def find_delta_base(request: web.Request, key: CardKey) -> Optional[Tuple[CachedCard, str]]:
+    """Find the previous card version and the ETag of the variant the client holds, if it accepts deltas."""
+    if DELTA not in accepted_media_types(request):
+        return None
+    for tag in request.if_none_match or ():
+        base = card_cache.find_version(key, base_etag(tag.value))
+        if base:
+            return base, tag.value
+    return None
+
+
+def get_card_key(request: web.Request) -> CardKey:
+    """Read the requested dashboard and card selector, defaulting to the weather card."""
+    dashboard = request.query.get("dashboard", DEFAULT_CARD.dashboard)
+    selector = request.query.get("selector", DEFAULT_CARD.selector)
+    if not DASHBOARD_PATTERN.match(dashboard):
+        raise web.HTTPBadRequest(text="Invalid dashboard path")
+    if not selector.strip() or len(selector) > MAX_SELECTOR_LENGTH or not selector.isprintable():
+        raise web.HTTPBadRequest(text="Invalid selector")
+    return CardKey(dashboard, selector)
+
+
+async def get_card(request: web.Request) -> web.Response:
+    key = get_card_key(request)
+    card_format = get_format(request)
+    if not scheduler.track(key):
+        raise web.HTTPServiceUnavailable(text="Too many cards")
+
+    card = card_cache.get(key)
+    if card is None:
+        CACHE_REQUESTS.inc(result="miss")
+        card = await card_cache.wait(key, card_wait_timeout)
+    elif card_cache.is_stale(card):
+        CACHE_REQUESTS.inc(result="stale")
+    else:
+        CACHE_REQUESTS.inc(result="hit")
+    if card is None:
+        raise web.HTTPServiceUnavailable(
+            headers={"Retry-After": str(int(capture_retry_interval))}
+        )
+
+    # Stale-while-revalidate: serve the old card and let the scheduler catch up
+    if card_cache.is_stale(card):
+        scheduler.request_refresh(key)
+
+    variant = card.variants.get(card_format)
+    if variant is None:
+        # Formats are encoded after the capture, only unusual ones are left for requests
+        variant = await asyncio.to_thread(get_variant, card, card_format)
+    headers = {
+        "Age": str(int(card.age())),
+        "Cache-Control": f"max-age={max(0, int(capture_interval - card.age()))}, "
+        f"stale-while-revalidate={int(capture_interval)}",
+        "ETag": f'"{variant.etag}"',
+        "Last-Modified": formatdate(card.modified_at, usegmt=True),
+        "X-Capture-Duration": f"{card.capture_duration:.3f}",
+        "Vary": "Accept",
+        **variant.headers,
+    }
+    if is_not_modified(request, variant.etag, card.modified_at):
+        return web.Response(status=304, headers=headers)
+
+    held = find_delta_base(request, key)
+    if held:
+        base, held_etag = held
+        # Building a delta decodes both versions, keep it off the event loop
+        delta = await asyncio.to_thread(
+            get_delta, card, base, card_format, held_etag, delta_tile_size
+        )
+        if delta is not None and len(delta) < len(variant.data):
+            headers["X-Delta-Base"] = held_etag
+            return web.Response(body=delta, content_type=DELTA, headers=headers)
+
+    return web.Response(body=variant.data, content_type=variant.media_type, headers=headers)
+
+
+async def get_card_updates(request: web.Request) -> web.Response:
+    """
+    Long poll for a new version of a card.
+
+    The client passes the version it holds in ?version=. The request returns
+    as soon as the card has another version, or with the same version after
+    ?timeout= seconds (at most LONG_POLL_TIMEOUT). Clients then fetch the
+    card only when the version changed.
+    """
+    key = get_card_key(request)
     try:
-        server.serve_forever()
-    except KeyboardInterrupt:
-        logger.info("Server stopped by user")
-        server.server_close()
+        timeout = float(request.query.get("timeout", long_poll_timeout))
+    except ValueError:
+        raise web.HTTPBadRequest(text="Invalid timeout")
+    # nan, inf and timeouts that return at once would turn the long poll into a busy poll
+    if not math.isfinite(timeout) or timeout <= 0:
+        raise web.HTTPBadRequest(text="Invalid timeout")
+    timeout = min(timeout, long_poll_timeout)
+    if not scheduler.track(key):
+        raise web.HTTPServiceUnavailable(text="Too many cards")
+
+    with CARD_SUBSCRIBERS.track_in_progress():
+        card = await card_cache.wait_for_change(key, request.query.get("version"), timeout)
+    if card is None:
+        raise web.HTTPServiceUnavailable(
+            headers={"Retry-After": str(int(capture_retry_interval))}
+        )
+    return web.json_response(
+        {"version": card.etag, "modified_at": card.modified_at},
+        headers={"Cache-Control": "no-store"},
+    )
+
+
+async def metrics(request: web.Request) -> web.Response:
+    return web.Response(body=REGISTRY.render().encode(), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+
+async def capture_context(app: web.Application):
+    scheduler.start()
+    yield
+    await scheduler.stop()
+
+
+def create_app() -> web.Application:
+    app = web.Application(middlewares=[metrics_middleware, api_key_middleware])
+    app.router.add_get("/", index)
+    app.router.add_get("/weather-card", get_card)
+    app.router.add_get("/card", get_card)
+    app.router.add_get("/weather-card/updates", get_card_updates)
+    app.router.add_get("/card/updates", get_card_updates)
+    app.router.add_get("/health", health_check)
+    app.router.add_get("/metrics", metrics)
+    app.cleanup_ctx.append(capture_context)
+    return app
+
+
+if __name__ == "__main__":
+    logger.info(f"Starting server on port {port}")
+    # run_app handles SIGINT/SIGTERM and shuts the capture scheduler down cleanly
+    web.run_app(
+        create_app(),
+        host="0.0.0.0",
+        port=port,
+        access_log=logger,
+        access_log_class=AccessLogger,
+        keepalive_timeout=keepalive_timeout,
+        print=None,
+    )
@@ -0,0 +1,106 @@
+import asyncio
+import io
+import os
+import sys
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import aiohttp
+from card_renderer import CARD_SIZE, DEFAULT_DASHBOARD, WEATHER_CARD_SELECTOR, CardRenderer
+from dotenv import load_dotenv
+from metrics import CAPTURE_PHASE_SECONDS
+from PIL import Image
+
+# Add project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from common.logging_config import logger
+from common.weather_card_renderer import WeatherCardRenderer
+from common.weather_data import Forecast, WeatherData
+
+logger = logger.getChild(__name__)
+load_dotenv()
+
+HA_URL = os.getenv("HA_URL")
+HA_TOKEN = os.getenv("HA_TOKEN")
+WEATHER_ENTITY = os.getenv("WEATHER_ENTITY", "weather.smhi_home")
+FORECAST_TYPE = os.getenv("FORECAST_TYPE", "daily")
+
+
+class PillowCardRenderer(CardRenderer):
+    def __init__(self, size: Tuple[int, int] = CARD_SIZE) -> None:
+        """
+        Draw the weather card with Pillow from the Home Assistant REST API.
+
+        Needs neither a browser nor a dashboard, so it runs on the same
+        hardware as the stations. The dashboard and selector of a card are
+        ignored, every card shows WEATHER_ENTITY.
+
+        Args:
+            size (Tuple[int, int]): Dimensions of the card, the layout follows them
+        """
+        self.size = size
+        self.renderer = WeatherCardRenderer(size=size)
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._encoded: Optional[Tuple[Image.Image, bytes]] = None
+
+    async def start(self) -> "PillowCardRenderer":
+        if not HA_URL or not HA_TOKEN:
+            raise RuntimeError("HA_URL and HA_TOKEN must be set for the pillow renderer")
+        self.session = aiohttp.ClientSession(
+            headers={"Authorization": f"Bearer {HA_TOKEN}"},
+            timeout=aiohttp.ClientTimeout(total=10),
+        )
+        return self
+
+    async def close(self) -> None:
+        if self.session:
+            await self.session.close()
+
+    async def _get_weather(self) -> Optional[WeatherData]:
+        async with self.session.get(f"{HA_URL}/api/states/{WEATHER_ENTITY}") as resp:
+            resp.raise_for_status()
+            state = await resp.json()
+        return WeatherData.from_dict(state["attributes"], state["state"])
+
+    async def _get_forecast(self) -> List[Forecast]:
+        """Fetch the forecast with weather.get_forecasts, empty if Home Assistant has no such service."""
+        async with self.session.post(
+            f"{HA_URL}/api/services/weather/get_forecasts?return_response",
+            json={"entity_id": WEATHER_ENTITY, "type": FORECAST_TYPE},
+        ) as resp:
+            if resp.status != 200:
+                logger.debug(f"weather.get_forecasts returned status {resp.status}")
+                return []
+            response = (await resp.json()).get("service_response", {})
+        return Forecast.from_list(response.get(WEATHER_ENTITY, {}).get("forecast", []))
+
+    def _encode(self, weather: WeatherData, forecast: List[Forecast]) -> bytes:
+        image = self.renderer.render(weather, forecast)
+        # The renderer returns the same image for unchanged data, encode it only once
+        if self._encoded and self._encoded[0] is image:
+            return self._encoded[1]
+        output = io.BytesIO()
+        image.save(output, format="PNG")
+        self._encoded = (image, output.getvalue())
+        return self._encoded[1]
+
+    async def capture_weather_card(
+        self, dashboard: str = DEFAULT_DASHBOARD, selector: str = WEATHER_CARD_SELECTOR
+    ) -> Optional[bytes]:
+        """
+        Draw the card from the current state and forecast of WEATHER_ENTITY.
+
+        Returns:
+            Optional[bytes]: The PNG encoded card, or None if Home Assistant could not be read
+        """
+        try:
+            with CAPTURE_PHASE_SECONDS.time(phase="fetch"):
+                weather, forecast = await asyncio.gather(self._get_weather(), self._get_forecast())
+        except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, TypeError, ValueError) as e:
+            logger.error(f"Failed to read {WEATHER_ENTITY} from Home Assistant: {e}")
+            return None
+        with CAPTURE_PHASE_SECONDS.time(phase="render"):
+            return await asyncio.to_thread(self._encode, weather, forecast)
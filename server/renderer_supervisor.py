@@ -0,0 +1,235 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from card_renderer import DEFAULT_DASHBOARD, MAX_PAGES, WEATHER_CARD_SELECTOR, CardRenderer
+from dotenv import load_dotenv
+
+# Add project root to Python path
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+from common.logging_config import logger
+
+logger = logger.getChild(__name__)
+load_dotenv()
+
+# Captures after which the browser is replaced, 0 to never recycle by count
+BROWSER_MAX_CAPTURES = int(os.getenv("BROWSER_MAX_CAPTURES", 1000))
+# Memory of the browser processes in MB after which the browser is replaced, 0 to not check
+BROWSER_MAX_RSS_MB = float(os.getenv("BROWSER_MAX_RSS_MB", 600))
+# Consecutive failed captures after which the browser is replaced
+BROWSER_MAX_FAILURES = int(os.getenv("BROWSER_MAX_FAILURES", 3))
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def child_processes_rss(pid: Optional[int] = None) -> Optional[int]:
+    """
+    Sum the resident memory of all descendants of a process.
+
+    The browser runs in processes started by the Playwright driver, which
+    is a child of the server, so this is the memory of the browsers.
+
+    Args:
+        pid (int, optional): The ancestor, the current process by default
+
+    Returns:
+        Optional[int]: Resident memory in bytes, None where /proc is not available
+    """
+    pid = pid or os.getpid()
+    try:
+        entries = [int(name) for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return None
+
+    children: Dict[int, list] = {}
+    for entry in entries:
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces, the fields after it don't
+                parent = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(entry)
+
+    total = 0
+    pending = list(children.get(pid, []))
+    while pending:
+        child = pending.pop()
+        pending.extend(children.get(child, []))
+        try:
+            with open(f"/proc/{child}/statm") as f:
+                total += int(f.read().split()[1]) * PAGE_SIZE
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+
+class RendererSupervisor(CardRenderer):
+    def __init__(
+        self,
+        factory: Callable[[], CardRenderer],
+        max_captures: int = BROWSER_MAX_CAPTURES,
+        max_rss_mb: float = BROWSER_MAX_RSS_MB,
+        max_failures: int = BROWSER_MAX_FAILURES,
+    ) -> None:
+        """
+        Keep a renderer healthy by replacing it before it degrades.
+
+        A renderer is recycled after `max_captures` captures, when the browser
+        processes use more than `max_rss_mb`, when it reports it is no longer
+        healthy, e.g. because the browser crashed, or after `max_failures`
+        failed captures in a row.
+
+        The replacement is started in the background while the old renderer
+        keeps serving. It captures the recently requested cards once, which
+        loads their dashboards and logs in, so it is warm when new captures go
+        to it. The old renderer is closed as soon as its last capture finished,
+        so no capture is dropped.
+
+        Args:
+            factory (Callable[[], CardRenderer]): Creates a new, not yet started renderer
+            max_captures (int): Captures per renderer, 0 for no limit
+            max_rss_mb (float): Memory limit of the browser processes, 0 for no limit
+            max_failures (int): Consecutive failures before recycling
+        """
+        self.factory = factory
+        self.max_captures = max_captures
+        self.max_rss_mb = max_rss_mb
+        self.max_failures = max_failures
+        self.current: Optional[CardRenderer] = None
+        self.size = (0, 0)
+        self.captures = 0
+        self.failures = 0
+        self.generation = 0
+        # Dashboard and selector of the recently captured cards, least recently used first
+        self._cards: Dict[Tuple[str, str], None] = {}
+        self._in_flight: Dict[CardRenderer, int] = {}
+        self._retired: set = set()
+        self._replacement: Optional[asyncio.Task] = None
+
+    async def start(self) -> "RendererSupervisor":
+        self.current = await self.factory().start()
+        self.size = self.current.size
+        self._in_flight[self.current] = 0
+        self.generation = 1
+        return self
+
+    async def close(self) -> None:
+        if self._replacement:
+            self._replacement.cancel()
+            try:
+                await self._replacement
+            except asyncio.CancelledError:
+                pass
+        renderers = set(self._in_flight)
+        self._in_flight.clear()
+        self._retired.clear()
+        for renderer in renderers:
+            await renderer.close()
+        self.current = None
+
+    def memory_usage(self) -> Optional[int]:
+        return child_processes_rss()
+
+    def is_healthy(self) -> bool:
+        return self.current is not None
+
+    async def capture_weather_card(
+        self, dashboard: str = DEFAULT_DASHBOARD, selector: str = WEATHER_CARD_SELECTOR
+    ) -> Optional[bytes]:
+        renderer = self.current
+        self._track((dashboard, selector))
+        self._in_flight[renderer] += 1
+        data = None
+        cancelled = False
+        try:
+            data = await renderer.capture_weather_card(dashboard, selector)
+            return data
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            self._in_flight[renderer] -= 1
+            # Only the renderer that is still current counts towards recycling. A crashed
+            # browser raises instead of returning None, both count as failures.
+            if renderer is self.current and not cancelled:
+                self.captures += 1
+                self.failures = 0 if data else self.failures + 1
+                self._check(renderer)
+            if renderer in self._retired and self._in_flight[renderer] == 0:
+                await self._close_retired(renderer)
+
+    def _track(self, card: Tuple[str, str]) -> None:
+        """Remember a card, so a replacement renderer is warmed up for it."""
+        self._cards.pop(card, None)
+        self._cards[card] = None
+        while len(self._cards) > MAX_PAGES:
+            del self._cards[next(iter(self._cards))]
+
+    def _check(self, renderer: CardRenderer) -> None:
+        """Start a replacement if the renderer hit one of the limits."""
+        if self._replacement:
+            return
+        reason = None
+        if not renderer.is_healthy():
+            reason = "it is no longer healthy"
+        elif self.failures >= self.max_failures:
+            reason = f"{self.failures} captures failed in a row"
+        elif self.max_captures and self.captures >= self.max_captures:
+            reason = f"it made {self.captures} captures"
+        elif self.max_rss_mb:
+            rss = self.memory_usage()
+            if rss is not None and rss > self.max_rss_mb * 1024 * 1024:
+                reason = f"its processes use {rss / 1024 / 1024:.0f} MB"
+        if reason:
+            logger.info(f"Recycling renderer {self.generation} because {reason}")
+            self._replacement = asyncio.create_task(self._replace(), name="renderer-replacement")
+
+    async def _warm_up(self, renderer: CardRenderer) -> None:
+        """Capture every tracked card once, so the first real captures find their pages loaded."""
+        for dashboard, selector in list(self._cards):
+            try:
+                if not await renderer.capture_weather_card(dashboard, selector):
+                    logger.warning(f"Warming up the replacement for {dashboard} failed")
+            except Exception as e:
+                logger.warning(f"Warming up the replacement for {dashboard} failed: {e}")
+
+    async def _replace(self) -> None:
+        """Start a new renderer, warm it up, swap it in and retire the old one."""
+        try:
+            replacement = await self.factory().start()
+            try:
+                await self._warm_up(replacement)
+            except asyncio.CancelledError:
+                await replacement.close()
+                raise
+        except Exception as e:
+            # Keep serving with the old renderer, the next capture tries again
+            logger.error(f"Failed to start a replacement renderer: {e}")
+            return
+        finally:
+            self._replacement = None
+
+        old = self.current
+        self._in_flight[replacement] = 0
+        self.current = replacement
+        self.captures = 0
+        self.failures = 0
+        self.generation += 1
+        logger.info(f"Renderer {self.generation} took over")
+
+        self._retired.add(old)
+        if self._in_flight[old] == 0:
+            await self._close_retired(old)
+
+    async def _close_retired(self, renderer: CardRenderer) -> None:
+        self._retired.discard(renderer)
+        self._in_flight.pop(renderer, None)
+        try:
+            await renderer.close()
+        except Exception as e:
+            logger.warning(f"Failed to close retired renderer: {e}")
@@ -0,0 +1,123 @@
+import asyncio
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+# Add the server modules to the Python path
+server_dir = str(Path(__file__).parent.parent)
+if server_dir not in sys.path:
+    sys.path.insert(0, server_dir)
+from card_renderer import CardRenderer
+from renderer_supervisor import RendererSupervisor
+
+
+class CrashedRenderer(CardRenderer):
+    """A renderer whose browser is gone: every capture raises, like Playwright does."""
+
+    def __init__(self, healthy: bool = False) -> None:
+        self.size = (320, 240)
+        self.healthy = healthy
+        self.closed = False
+
+    async def start(self) -> "CrashedRenderer":
+        return self
+
+    async def close(self) -> None:
+        self.closed = True
+
+    def is_healthy(self) -> bool:
+        return self.healthy
+
+    async def capture_weather_card(self, dashboard: str = "", selector: str = "") -> Optional[bytes]:
+        raise RuntimeError("Target page, context or browser has been closed")
+
+
+class WorkingRenderer(CrashedRenderer):
+    def __init__(self, healthy: bool = False) -> None:
+        super().__init__(healthy)
+        self.captured: List[str] = []
+
+    async def capture_weather_card(self, dashboard: str = "", selector: str = "") -> Optional[bytes]:
+        self.captured.append(dashboard)
+        return b"card"
+
+
+def supervise(renderers: List[CardRenderer], **limits) -> RendererSupervisor:
+    limits = {"max_captures": 0, "max_rss_mb": 0, "max_failures": 3, **limits}
+    return RendererSupervisor(lambda: renderers.pop(0), **limits)
+
+
+async def capture_until_replaced(supervisor: RendererSupervisor, attempts: int) -> None:
+    for _ in range(attempts):
+        try:
+            await supervisor.capture_weather_card()
+        except RuntimeError:
+            pass
+        # Let the replacement start in the background
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+
+def test_raising_unhealthy_renderer_is_replaced():
+    async def run():
+        crashed, replacement = CrashedRenderer(healthy=False), WorkingRenderer(healthy=True)
+        supervisor = await supervise([crashed, replacement]).start()
+
+        await capture_until_replaced(supervisor, 1)
+
+        assert supervisor.current is replacement
+        assert supervisor.generation == 2
+        assert crashed.closed
+        assert await supervisor.capture_weather_card() == b"card"
+        await supervisor.close()
+
+    asyncio.run(run())
+
+
+def test_raising_renderer_is_replaced_after_repeated_failures():
+    async def run():
+        crashed, replacement = CrashedRenderer(healthy=True), WorkingRenderer(healthy=True)
+        supervisor = await supervise([crashed, replacement], max_failures=3).start()
+
+        await capture_until_replaced(supervisor, 2)
+        assert supervisor.current is crashed
+        assert supervisor.failures == 2
+
+        await capture_until_replaced(supervisor, 1)
+        assert supervisor.current is replacement
+        assert supervisor.failures == 0
+        await supervisor.close()
+
+    asyncio.run(run())
+
+
+def test_capture_errors_are_raised_to_the_caller():
+    async def run():
+        supervisor = await supervise([CrashedRenderer(healthy=True), WorkingRenderer()]).start()
+        try:
+            await supervisor.capture_weather_card()
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("The capture error was swallowed")
+        assert supervisor.captures == 1
+        await supervisor.close()
+
+    asyncio.run(run())
+
+
+def test_replacement_is_warmed_up_before_it_takes_over():
+    async def run():
+        old, replacement = WorkingRenderer(healthy=True), WorkingRenderer(healthy=True)
+        supervisor = await supervise([old, replacement], max_captures=3).start()
+
+        for dashboard in ("/weather/0", "/weather/1", "/weather/0"):
+            await supervisor.capture_weather_card(dashboard)
+        await asyncio.sleep(0)
+
+        assert supervisor.current is replacement
+        # Every card was captured once, least recently used first
+        assert replacement.captured == ["/weather/1", "/weather/0"]
+        await supervisor.close()
+
+    asyncio.run(run())